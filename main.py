@@ -5,39 +5,50 @@
 """
 
 # Library Imports
-import numpy
 import sys
-from subprocess import call
 
 # Local Imports
 
+# Commands import their modules when they run so startup stays fast (NumPy and
+# the engine are only loaded by commands that need them)
 from scripts.menu import title, help, details
-from scripts.difference import difference
-from scripts.multiple import multiple
-from scripts.tests import test
-from scripts.manual import manual
 
 """
     Global variables
 """
 bases_pairs = ["AC", "AG", "AA", "GA", "GG", "GT", "CA", "CC", "CT", "TC", "TT", "TG"]
 
+
+def count_samples():
+    """
+        Description: Number of samples in the catalog, read on first use
+    """
+    global samples
+    if samples is None:
+        with open("dna_samples/catalog.txt") as f:
+            samples = int(sum(1 for _ in f) / 7)
+    return samples
+
+
+def clear():
+    from subprocess import call
+    call(['clear'])
+
+
+samples = None
+
 if __name__ == '__main__':
 
+    # batch sub-commands (tm, difference) skip the interactive prompt
     if len(sys.argv) > 1:
-        print("Program only accepts two total command line arguments")
-        print("usage: python compiler.py")
-        sys.exit(0)
+        from scripts.cli import main
+        sys.exit(main(sys.argv[1:]))
 
-    call(['clear'])
+    clear()
     title()
     details()
     help()
 
-    # number of samples
-    with open("dna_samples/catalog.txt") as f:
-        samples = int(sum(1 for _ in f) / 7)
-
     # Command prompt loop
     while True:
         command = input("[DNA]>> ").strip().split()
@@ -46,17 +57,67 @@ if __name__ == '__main__':
         elif command[0] == "help" or command[0] == "h":
             help()
         elif command[0] == "clear" or command[0] == "c":
-            call(['clear'])
+            clear()
         elif command[0] == "multiple" or command[0] == "m":
-            multiple()
+            # optional arguments: number of worker processes and random seed
+            if len(command) > 1 and not all(arg.isdigit() for arg in command[1:3]):
+                print("usage: multiple [workers] [seed]")
+            else:
+                from scripts.multiple import multiple
+                multiple(*[int(arg) for arg in command[1:3]])
         elif command[0] == "difference" or command[0] == "d":
-            difference()
+            # optional arguments: worker processes, random seed, sequences per length and
+            # substitutions per sequence
+            if len(command) > 1 and not all(arg.isdigit() for arg in command[1:5]):
+                print("usage: difference [workers] [seed] [sequences] [substitutions]")
+            elif any(int(arg) < 1 for arg in command[3:5]):
+                print("sequences and substitutions have to be at least 1")
+            else:
+                from scripts.difference import difference
+                difference(*[int(arg) for arg in command[1:5]])
         elif command[0] == "manual" or command[0] == "man":
+            from scripts.manual import manual
             manual()
+        elif command[0] == "scan" or command[0] == "sc":
+            from scripts.scan import scan
+            scan()
+        elif command[0] == "design" or command[0] == "de":
+            from scripts.design import design
+            design()
+        elif command[0] == "sweep":
+            # sweep <spec.json> [workers], run again to resume an interrupted sweep
+            if len(command) < 2 or (len(command) > 2 and not command[2].isdigit()):
+                print("usage: sweep <spec.json> [workers]")
+            else:
+                from scripts.sweep import load_spec, run_sweep
+                try:
+                    run_sweep(load_spec(command[1]), *[int(arg) for arg in command[2:3]])
+                except (OSError, ValueError) as error:
+                    print(error)
+        elif command[0] == "cache":
+            from scripts.cache import show_stats, enable_persistent_cache
+            # cache persist [path] keeps results on disk across runs
+            if len(command) > 1 and command[1] == "persist":
+                enable_persistent_cache(command[2] if len(command) > 2 else None)
+            show_stats()
+        elif command[0] == "profile":
+            from scripts import instrument
+            # profile on|off|reset|report [path]
+            if len(command) > 1 and command[1] == "on":
+                instrument.enable()
+            elif len(command) > 1 and command[1] == "off":
+                instrument.disable()
+            elif len(command) > 1 and command[1] == "reset":
+                instrument.reset()
+            elif len(command) > 2 and command[1] == "report":
+                instrument.export(command[2])
+            else:
+                instrument.show()
         elif command[0] == "test" or command[0] == "t":
+            from scripts.tests import test, test_all
             if len(command) > 1:
                 if command[1] == "all":
-                    test_all(samples)
+                    test_all(count_samples())
                 elif not command[1].isdigit():
                     print("2nd argument has to be an integer")
                 elif int(command[1]) > 15 or int(command[1]) < 1:
@@ -68,14 +129,15 @@ if __name__ == '__main__':
                 if file_name.isdigit() and int(file_name) <  16 and int(file_name) > 0:
                     test(file_name)
                 elif file_name == "all":
-                    test_all(samples)
+                    test_all(count_samples())
                 else:
                     print("Integer between 0 and 26 required")
                     continue
         elif command[0] == "show" or command[0] == "s":
+            from scripts.tests import test, test_all
             if len(command) > 1:
                 if command[1] == "all":
-                    test_all(samples)
+                    test_all(count_samples())
                 elif not command[1].isdigit():
                     print("2nd argument has to be an integer")
                 elif int(command[1]) > 15 or int(command[1]) < 1:
@@ -87,14 +149,15 @@ if __name__ == '__main__':
                 if file_name.isdigit() and int(file_name) <  16 and int(file_name) > 0:
                     test(file_name)
                 elif file_name == "all":
-                    test_all(samples)
+                    test_all(count_samples())
                 else:
                     print("Integer between 0 and 16 required")
                     continue
         elif command[0] == "show" or command[0] == "s":
+            from scripts.tests import show, show_all
             if len(command) > 1:
                 if command[1] == "all":
-                    show_all(samples)
+                    show_all(count_samples())
                 elif not command[1].isdigit():
                     print("2nd argument has to be an integer")
                 elif int(command[1]) > 15 or int(command[1]) < 1:
@@ -106,7 +169,7 @@ if __name__ == '__main__':
                 if file_name.isdigit():
                     show(file_name)
                 elif file_name == "all":
-                    show_all(samples)
+                    show_all(count_samples())
                 else:
                     print("Integer between 0 and 16 required")
                     continue
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+    Benchmarks. Run from the repository root:
+
+        python3 -m scripts.benchmark startup
+        python3 -m scripts.benchmark run [--full] [--save]
+
+    startup measures how long main.py takes to get going (wall time and the total
+    import time reported by python -X importtime) and checks it against a budget.
+    Heavy modules must not be imported before a command that needs them runs.
+
+    run times the scalar and batch engines across duplex lengths, batch sizes and
+    0, 1 or 2 mismatches, sample parsing, FASTA ingest, the symmetry index,
+    calculate_differences and pseudo-sequence expansion. Results are compared against a JSON baseline and
+    cases slower than the baseline by more than the tolerance are flagged. --save
+    writes the results as the new baseline.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# kept outside output/, which make clean empties
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# grids for the quick run and --full, cases above the base budget are skipped
+QUICK = {"lengths": [5, 20, 100, 1000], "batches": [1, 100, 10000], "budget": 10 ** 6, "scalar_budget": 10 ** 5,
+         "difference_lengths": [5, 20, 130], "genome_lengths": [10 ** 4, 10 ** 5]}
+FULL = {"lengths": [5, 20, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6], "batches": [1, 100, 10 ** 4, 10 ** 6],
+        "budget": 10 ** 8, "scalar_budget": 10 ** 6, "difference_lengths": [5, 10, 20, 50, 100, 130, 500],
+        "genome_lengths": [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]}
+PSEUDO_SEQUENCES = ["3M3", "20M20", "R10MR10", "R50MR50", "20M20M20"]
+
+# name: (main.py arguments, stdin, import time budget in microseconds, modules that must not load)
+STARTUP_BUDGETS = {
+    "repl": ([], "q\n", 60000, ["numpy", "scripts.genome", "scripts.difference", "scripts.cache"]),
+    "help": (["--help"], "", 60000, ["numpy", "termcolor", "scripts.genome"]),
+}
+
+
+def parse_importtime(stderr):
+    """
+        Description: Read the output of python -X importtime
+
+        Returns: (total import time in microseconds, set of imported module names)
+    """
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        name = fields[2].rstrip()
+        modules.add(name.strip())
+        # only top level imports, nested ones are included in their cumulative time
+        if not name.startswith("  "):
+            total += int(fields[1])
+    return total, modules
+
+
+def measure_startup(args, stdin, runs=5):
+    """
+        Description: Start main.py runs times
+
+        Returns: (median wall time in seconds, median import time in microseconds,
+            imported module names)
+    """
+    walls = []
+    imports = []
+    modules = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", "main.py"] + args, cwd=ROOT,
+                                 input=stdin, capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        total, modules = parse_importtime(process.stderr)
+        imports.append(total)
+    return statistics.median(walls), statistics.median(imports), modules
+
+
+def startup(runs=5):
+    """
+        Description: Check every startup budget
+
+        Returns: (results dictionary, True when all budgets are met)
+    """
+    results = {}
+    ok = True
+    for name, (args, stdin, budget, forbidden) in STARTUP_BUDGETS.items():
+        wall, imports, modules = measure_startup(args, stdin, runs)
+        loaded = sorted(module for module in forbidden if module in modules)
+        passed = imports <= budget and not loaded
+        ok = ok and passed
+        results[name] = {"wall_s": wall, "import_us": imports, "budget_us": budget,
+                         "forbidden_loaded": loaded, "passed": passed}
+    return results, ok
+
+
+def best_time(function, repeats):
+    """
+        Description: Best wall time of repeats calls of function
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_duplexes(count, length, mismatches, rng):
+    """
+        Description: Random matched duplexes with 0, 1 or 2 separated inner mismatches,
+            drawn as code matrices (see sequence_add.random_duplexes)
+
+        Returns: (three_primes, five_primes) lists of strings
+    """
+    from scripts.encoding import decode
+    from scripts.sequence_add import random_duplexes
+
+    three, five = random_duplexes(count, length, rng=rng)
+    for position in [[], [length // 2], [length // 3, 2 * length // 3]][mismatches]:
+        three[:, position] = (three[:, position] + rng.integers(1, 4, size=count)) % 4
+    three = decode(three.ravel())
+    five = decode(five.ravel())
+    return ([three[start:start + length] for start in range(0, count * length, length)],
+            [five[start:start + length] for start in range(0, count * length, length)])
+
+
+def run_cases(grid, repeats):
+    """
+        Description: Time every benchmark case of the grid
+
+        Returns: Dictionary of case name -> seconds
+    """
+    import numpy
+
+    from scripts.cache import tm_cache
+    from scripts.difference import calculate_differences
+    from scripts.duplex import Sequence
+    from scripts.encoding import decode
+    from scripts.encoding import encode
+    from scripts.genome import find_melting_temperature, find_melting_temperatures, parse_genome
+    from scripts.ingest import read_records
+    from scripts.multiple import seudo_sequence_converter
+    from scripts.palindrome import SymmetryIndex
+    from scripts.sequence_add import add_mismatches
+
+    rng = numpy.random.default_rng(1)
+    results = {}
+    for length in grid["lengths"]:
+        for mismatches in (0, 1, 2):
+            if length < 5 and mismatches:
+                continue
+            for batch in grid["batches"]:
+                if length * batch > grid["budget"]:
+                    continue
+                three_primes, five_primes = benchmark_duplexes(batch, length, mismatches, rng)
+                case = "length=" + str(length) + ",batch=" + str(batch) + ",mismatches=" + str(mismatches)
+                results["find_melting_temperatures:" + case] = best_time(
+                    lambda: find_melting_temperatures(three_primes, five_primes), repeats)
+                if length * batch <= grid["scalar_budget"]:
+                    results["find_melting_temperature:" + case] = best_time(
+                        lambda: [find_melting_temperature(Sequence(three, five, .0004))
+                                 for three, five in zip(three_primes, five_primes)], repeats)
+
+    results["parse_genome:samples"] = best_time(lambda: [parse_genome(x) for x in range(1, 16)], repeats)
+    for length in grid["genome_lengths"]:
+        with tempfile.NamedTemporaryFile("w", suffix=".fa", delete=False) as f:
+            f.write(">benchmark\n")
+            genome = decode(rng.integers(0, 4, size=length, dtype=numpy.uint8))
+            for start in range(0, length, 60):
+                f.write(genome[start:start + 60] + "\n")
+        results["read_records:length=" + str(length)] = best_time(lambda: list(read_records(f.name)), repeats)
+        os.remove(f.name)
+        codes = encode(genome)
+        results["SymmetryIndex:length=" + str(length)] = best_time(lambda: SymmetryIndex(codes), repeats)
+
+    def cold_differences(length, seeds):
+        # every repeat draws new sequences into an empty cache, so later repeats do not
+        # time cache hits
+        tm_cache.clear()
+        return calculate_differences(length, seed=next(seeds))
+
+    store, tm_cache.store = tm_cache.store, None
+    try:
+        for length in grid["difference_lengths"]:
+            seeds = iter(range(1, repeats + 1))
+            results["calculate_differences:length=" + str(length)] = best_time(
+                lambda: cold_differences(length, seeds), repeats)
+    finally:
+        tm_cache.store = store
+
+    for pseudo in PSEUDO_SEQUENCES:
+        results["multiple_expansion:" + pseudo] = best_time(
+            lambda: add_mismatches(seudo_sequence_converter(pseudo)), repeats)
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """
+        Description: Find cases slower than the baseline by more than tolerance (and by
+            more than min_delta seconds, so timer noise on tiny cases is not flagged)
+
+        Returns: List of (case, baseline seconds, seconds) for regressed cases
+    """
+    regressions = []
+    for case, seconds in sorted(results.items()):
+        before = baseline.get(case)
+        if before is not None and seconds > before * (1 + tolerance) and seconds - before > min_delta:
+            regressions.append((case, before, seconds))
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python3 -m scripts.benchmark")
+    commands = parser.add_subparsers(dest="command")
+    startup_parser = commands.add_parser("startup", help="check main.py startup against its budget")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    run_parser = commands.add_parser("run", help="time the engine, ingest, differences and expansion")
+    run_parser.add_argument("--full", action="store_true", help="lengths and batch sizes up to 10^6")
+    run_parser.add_argument("--repeats", type=int, default=3)
+    run_parser.add_argument("--baseline", default=BASELINE)
+    run_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    run_parser.add_argument("--min-delta", type=float, default=0.001, help="ignore slowdowns below this (s)")
+    run_parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        results, ok = startup(args.runs)
+        print(json.dumps(results, indent=2))
+        return 0 if ok else 1
+    elif args.command == "run":
+        results = run_cases(FULL if args.full else QUICK, args.repeats)
+        for case, seconds in sorted(results.items()):
+            print("{:<80} {:>12.6f} s".format(case, seconds))
+
+        regressions = []
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f)["results"], args.tolerance, args.min_delta)
+            for case, before, seconds in regressions:
+                print("REGRESSION " + case + ": " + "{:.6f} s -> {:.6f} s".format(before, seconds))
+        if args.save:
+            os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+            with open(args.baseline, "w") as f:
+                json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                           "created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2,
+                          sort_keys=True)
+            print("Baseline written to " + args.baseline)
+        return 1 if regressions else 0
+    parser.print_usage()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
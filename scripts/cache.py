@@ -0,0 +1,228 @@
+import atexit
+import os
+import sys
+from collections import OrderedDict
+
+import numpy
+
+from scripts import instrument
+from scripts.encoding import pack
+from scripts.genome import find_melting_temperature
+from scripts.genome import find_melting_temperatures
+from scripts.genome import melting_dtype
+from scripts.store import DEFAULT_PATH
+from scripts.store import TmStore
+
+"""
+    In-process memoization of melting temperature results. A duplex and the same
+    duplex read from the other strand (5' strand reversed as the 3' strand) have the
+    same nearest neighbor sum, symmetry and initiation terms, the inverse key lookup
+    in energy.py relies on the same equivalence. Only the terminal A-T term is tied
+    to the orientation, so the two forms share one cache entry when that term comes
+    out the same for both.
+"""
+
+# rough memory of one entry besides the packed strands (dict slot, key and value tuples, floats)
+ENTRY_OVERHEAD = 320
+
+
+def canonical_key(three_prime, five_prime):
+    """
+        Description: Key that is the same for a duplex and its equivalent other strand reading
+
+        Returns: (length, packed strands) tuple
+
+        Input: three_prime, five_prime - strand strings
+    """
+    flipped_three = five_prime[::-1]
+    flipped_five = three_prime[::-1]
+    # terminal A-T of the flipped duplex comes from the initial T-A of this one
+    if ((three_prime[-1] + five_prime[-1] == "AT") == (three_prime[0] + five_prime[0] == "TA")
+            and flipped_three + flipped_five < three_prime + five_prime):
+        three_prime, five_prime = flipped_three, flipped_five
+    return len(three_prime), pack(three_prime) + pack(five_prime)
+
+
+class TmCache(object):
+    """
+        Least recently used cache bounded by entry count and approximate bytes,
+        optionally backed by a persistent TmStore that is consulted on a miss
+    """
+
+    def __init__(self, max_entries=100000, max_bytes=64 * 1024 * 1024, store=None):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            if self.store is not None:
+                value = self.store.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.store_hits += 1
+            self.remember(key, value)
+            return value
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.store is not None:
+            self.store.put(key, value)
+        self.remember(key, value)
+
+    def remember(self, key, value):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.entries[key] = value
+            return
+        self.entries[key] = value
+        self.bytes += entry_size(key)
+        while len(self.entries) > self.max_entries or (self.bytes > self.max_bytes and len(self.entries) > 1):
+            old_key, _ = self.entries.popitem(last=False)
+            self.bytes -= entry_size(old_key)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def flush(self):
+        if self.store is not None:
+            self.store.flush()
+
+    def stats(self):
+        """
+            Description: Hit/miss statistics
+
+            Returns: Dictionary with hits, misses, hit rate, evictions, entries and bytes
+        """
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.store_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes
+        }
+
+
+def entry_size(key):
+    return ENTRY_OVERHEAD + sys.getsizeof(key[1])
+
+
+tm_cache = TmCache()
+
+
+def enable_persistent_cache(path=None):
+    """
+        Description: Back the in-process cache with the on-disk store at path. The path is
+            also put in the DNA_TM_CACHE environment variable so worker processes use it
+    """
+    path = path or os.environ.get("DNA_TM_CACHE") or DEFAULT_PATH
+    os.environ["DNA_TM_CACHE"] = path
+    if tm_cache.store is not None:
+        tm_cache.store.close()
+    tm_cache.store = TmStore(path)
+
+
+if os.environ.get("DNA_TM_CACHE"):
+    enable_persistent_cache()
+atexit.register(tm_cache.flush)
+
+
+def cached_melting_temperature(s, cache=tm_cache):
+    """
+        Description: find_melting_temperature with results memoized in cache
+
+        Returns: Sequence object with energy, enthalpy, entropy, temperature values
+
+        Input: s - Sequence object, cache - TmCache to use
+    """
+    key = canonical_key(s.three_prime, s.five_prime)
+    value = cache.get(key)
+    if instrument.enabled:
+        instrument.count("cache.misses" if value is None else "cache.hits")
+    if value is None:
+        find_melting_temperature(s)
+        cache.put(key, (s.energy, s.enthalpy, s.entropy, s.temperature, s.complementary))
+    else:
+        s.set_energy(value[0])
+        s.set_enthalpy(value[1])
+        s.set_entropy(value[2])
+        s.set_temperature(value[3])
+        s.set_complementary(value[4])
+    return s
+
+
+def lookup_results(keys, cache=tm_cache):
+    """
+        Description: Look up a batch of duplexes in cache
+
+        Returns: (melting_dtype array with the cached rows filled in, indices of the
+            misses that still have to be evaluated)
+
+        Input: keys - canonical_key of every duplex, cache - TmCache to use
+    """
+    results = numpy.zeros(len(keys), dtype=melting_dtype)
+    missing = []
+    for index, key in enumerate(keys):
+        value = cache.get(key)
+        if value is None:
+            missing.append(index)
+        else:
+            results[index] = (key[0],) + tuple(value)
+    if instrument.enabled:
+        instrument.count("cache.hits", len(keys) - len(missing))
+        instrument.count("cache.misses", len(missing))
+    return results, missing
+
+
+def store_results(keys, results, missing, evaluated, cache=tm_cache):
+    """
+        Description: Fill the misses of lookup_results in with their find_melting_temperatures
+            results and remember them in cache
+
+        Returns: results
+    """
+    if missing:
+        results[missing] = evaluated
+        for index, row in zip(missing, evaluated.tolist()):
+            cache.put(keys[index], row[1:])
+    return results
+
+
+def cached_melting_temperatures(three_primes, five_primes, keys=None, cache=tm_cache):
+    """
+        Description: find_melting_temperatures with results memoized in cache, only the
+            duplexes not found there are evaluated (together, with the batch engine)
+
+        Returns: melting_dtype array, see find_melting_temperatures
+
+        Input: three_primes, five_primes - lists of strand strings, keys - their
+            canonical_key when already known, cache - TmCache to use
+    """
+    if keys is None:
+        keys = [canonical_key(three, five) for three, five in zip(three_primes, five_primes)]
+    results, missing = lookup_results(keys, cache)
+    evaluated = find_melting_temperatures([three_primes[x] for x in missing], [five_primes[x] for x in missing])
+    return store_results(keys, results, missing, evaluated, cache)
+
+
+def show_stats(cache=tm_cache):
+    """
+        Description: Prints cache statistics
+    """
+    for name, value in cache.stats().items():
+        print(name + ": " + str(value))
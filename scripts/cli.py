@@ -0,0 +1,422 @@
+import argparse
+import sys
+
+"""
+    Non-interactive command line interface for pipelines:
+
+        python3 main.py tm --input seqs.tsv --output results.tsv
+        python3 main.py difference --lengths 5 10 20 --workers 4 --seed 1
+        python3 main.py serve --port 8765
+        python3 main.py design --input target.fa --lengths 18 25 --range 330 335
+        python3 main.py index --genome genome.fa --index genome_index
+        python3 main.py offtarget --index genome_index --probe GATTACAGATTACAGGCCATTAGC
+        python3 main.py sweep --spec sweep.json --workers 4
+
+    Input is read as a stream and evaluated in chunks with the batch engine, output
+    is buffered. Exit codes follow sysexits: 0 success, 2 usage, 65 invalid input
+    data, 66 missing input file, 73 output cannot be created, 130 interrupted.
+"""
+
+EXIT_OK = 0
+EXIT_USAGE = 2
+EXIT_DATA = 65
+EXIT_NO_INPUT = 66
+EXIT_CANT_CREATE = 73
+EXIT_INTERRUPTED = 130
+
+complement_table = str.maketrans("ACGT", "TGCA")
+
+
+class InputError(Exception):
+    """ Raised for an input line that is not a valid duplex """
+
+
+def parser():
+    """
+        Description: Argument parser with one sub-command per batch mode
+    """
+    main_parser = argparse.ArgumentParser(prog="main.py", description="Melting temperature of DNA duplexes")
+    commands = main_parser.add_subparsers(dest="command")
+
+    tm = commands.add_parser("tm", help="melting temperature of every duplex in a TSV stream")
+    tm.add_argument("--input", "-i", default="-",
+                    help="one duplex per line: 3'/5', 3'<tab>5' or only the 3' strand (default stdin)")
+    tm.add_argument("--output", "-o", default="-", help="TSV results (default stdout)")
+    tm.add_argument("--chunk-size", type=int, default=10000, help="duplexes evaluated per batch")
+    tm.add_argument("--skip-invalid", action="store_true", help="report invalid lines on stderr and go on")
+    tm.add_argument("--no-header", action="store_true", help="do not write a header line")
+
+    difference = commands.add_parser("difference", help="average melting temperature change of one mismatch")
+    difference.add_argument("--lengths", type=int, nargs="+", default=[5, 10, 20, 50, 100, 130])
+    difference.add_argument("--workers", type=int, default=1)
+    difference.add_argument("--seed", type=int, default=None)
+    difference.add_argument("--sequences", type=int, default=100, help="matched sequences per length")
+    difference.add_argument("--substitutions", type=int, default=10, help="mismatches per sequence")
+    difference.add_argument("--target-width", type=float, default=None,
+                            help="sample in batches of --sequences until the 90%% half width is this small (K)")
+    difference.add_argument("--max-sequences", type=int, default=100000, help="budget per length with --target-width")
+    difference.add_argument("--output", "-o", default="-", help="TSV results (default stdout)")
+
+    design = commands.add_parser("design", help="oligos of a target with a melting temperature in a range")
+    design.add_argument("--input", "-i", default="-", help="FASTA/FASTQ file or plain 3' strand (default stdin)")
+    design.add_argument("--lengths", type=int, nargs=2, default=[18, 25], metavar=("MIN", "MAX"))
+    design.add_argument("--range", type=float, nargs=2, required=True, metavar=("LOW", "HIGH"),
+                        help="melting temperature range in Kelvin")
+    design.add_argument("--tm-target", type=float, default=None, help="preferred temperature (default mid range)")
+    design.add_argument("--top", type=int, default=10, help="results per record")
+    design.add_argument("--output", "-o", default="-", help="TSV results (default stdout)")
+
+    index = commands.add_parser("index", help="build the k-mer seed index of a genome for offtarget")
+    index.add_argument("--genome", "-g", required=True, help="FASTA/FASTQ genome")
+    index.add_argument("--index", required=True, help="directory the index is written to")
+    index.add_argument("-k", type=int, default=12, help="seed length")
+
+    offtarget = commands.add_parser("offtarget", help="genome sites a probe could bind with up to 2 mismatches")
+    offtarget.add_argument("--index", required=True, help="directory written by the index command")
+    offtarget.add_argument("--probe", "-p", nargs="+", help="probe strands (default: one per line on stdin)")
+    offtarget.add_argument("--max-mismatches", type=int, default=2)
+    offtarget.add_argument("--min-tm", type=float, default=None, help="only report sites at least this stable (K)")
+    offtarget.add_argument("--output", "-o", default="-", help="TSV results (default stdout)")
+
+    sweep = commands.add_parser("sweep", help="checkpointed grid of mismatch temperature differences")
+    sweep.add_argument("--spec", "-s", required=True, help="JSON sweep spec, see scripts/sweep.py")
+    sweep.add_argument("--workers", type=int, default=1)
+    sweep.add_argument("--root", default="output/sweeps", help="directory holding the sweeps")
+
+    serve = commands.add_parser("serve", help="local HTTP/JSON melting temperature service")
+    serve.add_argument("--host", default="127.0.0.1", help="loopback address to bind")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--window-ms", type=float, default=5.0, help="time to collect requests into one batch")
+    serve.add_argument("--max-batch", type=int, default=10000, help="duplexes per batch")
+    serve.add_argument("--max-queue", type=int, default=1000, help="waiting requests before answering 503")
+    return main_parser
+
+
+def main(argv):
+    """
+        Description: Run one batch command
+
+        Returns: Exit code
+
+        Input: argv - command line arguments without the program name
+    """
+    args = parser().parse_args(argv)
+    if args.command is None:
+        parser().print_usage(sys.stderr)
+        return EXIT_USAGE
+    try:
+        if args.command == "tm":
+            return run_tm(args)
+        elif args.command == "difference":
+            return run_difference(args)
+        elif args.command == "design":
+            return run_design(args)
+        elif args.command == "index":
+            return run_index(args)
+        elif args.command == "offtarget":
+            return run_offtarget(args)
+        elif args.command == "sweep":
+            return run_sweep(args)
+        elif args.command == "serve":
+            return run_serve(args)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # reader went away (e.g. piped into head), nothing left to do
+        sys.stderr.close()
+        return EXIT_OK
+    return EXIT_USAGE
+
+
+def open_input(path):
+    if path == "-":
+        return sys.stdin
+    return open(path, buffering=1024 * 1024)
+
+
+def open_output(path):
+    if path == "-":
+        return sys.stdout
+    return open(path, "w", buffering=1024 * 1024)
+
+
+def parse_duplex(line):
+    """
+        Description: Split an input line into 3' and 5' strands
+
+        Returns: (three_prime, five_prime)
+    """
+    fields = line.split("\t") if "\t" in line else line.split("/")
+    three = fields[0].strip().upper()
+    five = fields[1].strip().upper() if len(fields) > 1 else three.translate(complement_table)
+    if not three or len(three) != len(five) or three.strip("ACGT") or five.strip("ACGT"):
+        raise InputError(line)
+    return three, five
+
+
+def read_chunks(stream, size, skip_invalid):
+    """
+        Description: Read duplexes from stream in chunks of size
+
+        Returns: Generator of (three_primes, five_primes) lists
+    """
+    three_primes = []
+    five_primes = []
+    for number, line in enumerate(stream, 1):
+        line = line.rstrip("\n")
+        if not line.strip() or line.startswith("#"):
+            continue
+        try:
+            three, five = parse_duplex(line)
+        except InputError:
+            message = "line " + str(number) + ": not a duplex: " + line
+            if not skip_invalid:
+                raise InputError(message)
+            print(message, file=sys.stderr)
+            continue
+        three_primes.append(three)
+        five_primes.append(five)
+        if len(three_primes) >= size:
+            yield three_primes, five_primes
+            three_primes, five_primes = [], []
+    if three_primes:
+        yield three_primes, five_primes
+
+
+def run_tm(args):
+    from scripts.energy import NearestNeighborError
+    from scripts.genome import find_melting_temperatures
+
+    try:
+        source = open_input(args.input)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_NO_INPUT
+    try:
+        sink = open_output(args.output)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_CANT_CREATE
+
+    try:
+        if not args.no_header:
+            sink.write("three_prime\tfive_prime\tenergy\tenthalpy\tentropy\ttemperature\tlength\tcomplementary\n")
+        for three_primes, five_primes in read_chunks(source, args.chunk_size, args.skip_invalid):
+            results = find_melting_temperatures(three_primes, five_primes)
+            sink.write("".join(
+                three + "\t" + five + "\t" + str(energy) + "\t" + str(enthalpy) + "\t" + str(entropy) + "\t"
+                + str(temperature) + "\t" + str(length) + "\t" + str(complementary) + "\n"
+                for three, five, energy, enthalpy, entropy, temperature, length, complementary in zip(
+                    three_primes, five_primes, results["energy"].tolist(), results["enthalpy"].tolist(),
+                    results["entropy"].tolist(), results["temperature"].tolist(), results["length"].tolist(),
+                    results["complementary"].tolist())))
+    except (InputError, NearestNeighborError) as error:
+        print(error, file=sys.stderr)
+        return EXIT_DATA
+    finally:
+        sink.flush()
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return EXIT_OK
+
+
+def run_design(args):
+    from scripts.design import design_probes
+
+    try:
+        records = design_records(args.input)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_NO_INPUT
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return EXIT_DATA
+    try:
+        sink = open_output(args.output)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_CANT_CREATE
+
+    try:
+        sink.write("name\tposition\tlength\ttemperature\tdistance\tsequence\n")
+        for name, codes in records:
+            for distance, position, length, value, sequence in design_probes(
+                    codes, args.lengths[0], args.lengths[1], args.range[0], args.range[1], args.top, args.tm_target):
+                sink.write(name + "\t" + str(position) + "\t" + str(length) + "\t" + str(value) + "\t"
+                           + str(distance) + "\t" + sequence + "\n")
+            sink.flush()
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return EXIT_DATA
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    return EXIT_OK
+
+
+def design_records(path):
+    """
+        Description: Targets for design: the records of a FASTA/FASTQ file, or one
+        record named "target" for a file (or stdin) holding a plain strand
+
+        Returns: Iterable of (name, codes) tuples
+    """
+    from scripts.ingest import normalize
+    from scripts.ingest import read_records
+
+    if path == "-":
+        raw = sys.stdin.buffer.read()
+    else:
+        with open(path, "rb") as f:
+            raw = f.read(1)
+        if raw in (b">", b"@"):
+            return read_records(path)
+        with open(path, "rb") as f:
+            raw = f.read()
+    if not raw.lstrip().startswith(b">"):
+        return [("target", normalize(raw))]
+    records = []
+    for chunk in raw.lstrip()[1:].split(b"\n>"):
+        header, _, body = chunk.partition(b"\n")
+        records.append((header.decode().strip(), normalize(body)))
+    return records
+
+
+def run_index(args):
+    from scripts.offtarget import build_index
+
+    if not 1 <= args.k <= 32:
+        print("seed length has to be between 1 and 32", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        index = build_index(args.genome, args.index, args.k)
+    except FileNotFoundError as error:
+        print(error, file=sys.stderr)
+        return EXIT_NO_INPUT
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_CANT_CREATE
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return EXIT_DATA
+    print("Indexed " + str(len(index.keys)) + " " + str(index.k) + "-mers of " + str(len(index.names))
+          + " records in " + args.index, file=sys.stderr)
+    return EXIT_OK
+
+
+def run_offtarget(args):
+    from scripts.offtarget import KmerIndex
+    from scripts.offtarget import find_off_targets
+    from scripts.offtarget import site_sequence
+
+    try:
+        index = KmerIndex(args.index)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_NO_INPUT
+    probes = args.probe or [line.strip() for line in sys.stdin if line.strip() and not line.startswith("#")]
+    try:
+        sink = open_output(args.output)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_CANT_CREATE
+
+    try:
+        sink.write("probe\trecord\tposition\tstrand\tmismatches\tsite\tenergy\tenthalpy\tentropy\ttemperature\n")
+        for probe in probes:
+            probe = probe.upper()
+            if not probe or probe.strip("ACGT"):
+                raise InputError("not a probe: " + probe)
+            for site in find_off_targets(index, probe, args.max_mismatches):
+                if args.min_tm is not None and not site["temperature"] >= args.min_tm:
+                    continue
+                sink.write(probe + "\t" + index.names[site["record"]] + "\t" + str(site["position"]) + "\t"
+                           + site["strand"].decode() + "\t" + str(site["mismatches"]) + "\t"
+                           + site_sequence(index, site, len(probe)) + "\t" + str(site["energy"]) + "\t"
+                           + str(site["enthalpy"]) + "\t" + str(site["entropy"]) + "\t"
+                           + str(site["temperature"]) + "\n")
+            sink.flush()
+    except (InputError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return EXIT_DATA
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    return EXIT_OK
+
+
+def run_sweep(args):
+    from scripts.sweep import load_spec
+    from scripts.sweep import run_sweep as sweep
+
+    try:
+        spec = load_spec(args.spec)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_NO_INPUT
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return EXIT_DATA
+    try:
+        _, complete = sweep(spec, args.workers, args.root)
+    except BrokenPipeError:
+        raise
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_CANT_CREATE
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return EXIT_DATA
+    return EXIT_OK if complete else EXIT_INTERRUPTED
+
+
+def run_serve(args):
+    from scripts.server import serve
+
+    try:
+        serve(args.host, args.port, args.window_ms / 1000, args.max_batch, args.max_queue)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return EXIT_USAGE
+    return EXIT_OK
+
+
+def run_difference(args):
+    from scripts.difference import calculate_differences
+    from concurrent.futures import ProcessPoolExecutor
+
+    if any(length < 3 for length in args.lengths):
+        print("length cannot be less than 3 -- we cannot substitute peripheral matches", file=sys.stderr)
+        return EXIT_USAGE
+    if args.sequences < 1 or args.substitutions < 1:
+        print("sequences and substitutions have to be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    if args.target_width is not None and args.target_width <= 0:
+        print("target width has to be positive", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        sink = open_output(args.output)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return EXIT_CANT_CREATE
+
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    try:
+        sink.write("length\tmean\tmedian\tconfidence_90\tsamples\tseconds\tconverged\n")
+        for length in args.lengths:
+            mean, median, confidence, samples, seconds, converged = calculate_differences(
+                length, seed=args.seed, executor=executor, sequences=args.sequences,
+                substitutions=args.substitutions, target_width=args.target_width,
+                max_sequences=args.max_sequences)
+            sink.write(str(length) + "\t" + str(mean) + "\t" + str(median) + "\t"
+                       + confidence.split(" ± ")[1] + "\t" + str(samples) + "\t" + str(seconds) + "\t"
+                       + str(converged) + "\n")
+            sink.flush()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if sink is not sys.stdout:
+            sink.close()
+    return EXIT_OK
@@ -0,0 +1,170 @@
+import heapq
+
+import numpy
+
+from scripts.encoding import decode
+from scripts.energy import dimer_params
+from scripts.energy import initial_params
+from scripts.energy import symmetry_params
+from scripts.energy import terminal_params
+from scripts.genome import complementary_molarity_term
+from scripts.genome import molarity_term
+from scripts.ingest import normalize
+from scripts.ingest import unambiguous_runs
+from scripts.palindrome import SymmetryIndex
+
+"""
+    Probe and primer design: every window of a target whose melting temperature
+    falls in a range. The target is read as perfectly matched duplexes. Nearest
+    neighbor enthalpy and entropy are prefix summed once per block of the target,
+    so all windows of one length are evaluated together, and lengths that cannot
+    reach the range are skipped from bounds on their enthalpy and entropy.
+    Temperatures are in Kelvin like everywhere else in the program.
+"""
+
+# window starts evaluated together, memory stays proportional to this
+BLOCK = 1 << 16
+
+
+def temperature_bounds(k, dimers, ends):
+    """
+        Description: Lowest and highest melting temperature any window of k base pairs
+        can have given the dimer and end parameters that occur in the target
+
+        Returns: (lowest, highest) in Kelvin
+
+        Input: k - window length, dimers - (m, 2) enthalpy and entropy hundredths of
+            the target's dimers, ends - (2, 2) lowest and highest initiation plus
+            termination hundredths
+    """
+    h_low = (k - 1) * int(dimers[:, 0].min()) + int(ends[:, 0].min()) + min(0, int(symmetry_params[0]))
+    h_high = (k - 1) * int(dimers[:, 0].max()) + int(ends[:, 0].max()) + max(0, int(symmetry_params[0]))
+    s_low = (k - 1) * int(dimers[:, 1].min()) + int(ends[:, 1].min()) + min(0, int(symmetry_params[1]))
+    s_high = (k - 1) * int(dimers[:, 1].max()) + int(ends[:, 1].max()) + max(0, int(symmetry_params[1]))
+    candidates = []
+    for h in (h_low, h_high):
+        for s in (s_low, s_high):
+            for term in (complementary_molarity_term, molarity_term):
+                denominator = s / 100 + term
+                if denominator >= 0:
+                    # denominator can change sign, nothing can be ruled out
+                    return float("-inf"), float("inf")
+                candidates.append(h / 100 * 1000 / denominator)
+    return min(candidates), max(candidates)
+
+
+def window_temperatures(codes, kmin, kmax, tm_low, tm_high):
+    """
+        Description: Every window of kmin..kmax base pairs of an unambiguous run with a
+        melting temperature in [tm_low, tm_high]
+
+        Returns: Generator of (positions, k, temperatures) arrays, one per block and length
+
+        Input: codes - base codes of the 3' strand (the 5' strand is its complement)
+    """
+    codes = numpy.asarray(codes, dtype=numpy.intp)
+    for start in range(0, len(codes) - kmin + 1, BLOCK):
+        three = codes[start:start + BLOCK + kmax - 1]
+        five = three ^ 3
+        dimer_values = dimer_params[(three[:-1] << 6) | (three[1:] << 4) | (five[:-1] << 2) | five[1:]][:, :2]
+        enthalpy = numpy.concatenate(([0], numpy.cumsum(dimer_values[:, 0])))
+        entropy = numpy.concatenate(([0], numpy.cumsum(dimer_values[:, 1])))
+        pairs = (three << 2) | five
+        initial = initial_params[pairs][:, :2]
+        terminal = terminal_params[pairs][:, :2]
+        ends = numpy.array([[initial[:, 0].min() + terminal[:, 0].min(), initial[:, 1].min() + terminal[:, 1].min()],
+                            [initial[:, 0].max() + terminal[:, 0].max(), initial[:, 1].max() + terminal[:, 1].max()]])
+        symmetry = SymmetryIndex(three, five)
+
+        for k in range(kmin, min(kmax, len(three)) + 1):
+            if len(dimer_values):
+                lowest, highest = temperature_bounds(k, dimer_values, ends)
+                if highest < tm_low or lowest > tm_high:
+                    continue
+            positions = numpy.arange(min(BLOCK, len(three) - k + 1))
+            ends_at = positions + k - 1
+            symmetric = symmetry.symmetric(k)[:len(positions)]
+            h = enthalpy[ends_at] - enthalpy[positions] + initial[positions, 0] + terminal[ends_at, 0]
+            s = entropy[ends_at] - entropy[positions] + initial[positions, 1] + terminal[ends_at, 1]
+            h = h + symmetric * int(symmetry_params[0])
+            s = s + symmetric * int(symmetry_params[1])
+            temperatures = (h / 100 * 1000) / (s / 100 + numpy.where(symmetric, complementary_molarity_term,
+                                                                       molarity_term))
+            keep = (temperatures >= tm_low) & (temperatures <= tm_high)
+            if keep.any():
+                yield start + positions[keep], k, temperatures[keep]
+
+
+def design_candidates(target, kmin, kmax, tm_low, tm_high):
+    """
+        Description: Stream every candidate oligo of the target in the temperature range
+
+        Returns: Generator of (position, length, temperature) tuples
+
+        Input: target - 3' strand (string or base codes, ambiguous bases split the
+            target), kmin, kmax - oligo lengths, tm_low, tm_high - range in Kelvin
+    """
+    if kmin < 2 or kmax < kmin:
+        raise ValueError("Lengths have to satisfy 2 <= kmin <= kmax")
+    if tm_low > tm_high:
+        raise ValueError("Lowest temperature is above the highest")
+    codes = normalize(target.encode()) if isinstance(target, str) else numpy.asarray(target, dtype=numpy.uint8)
+    for offset, run in unambiguous_runs(codes, kmin):
+        for positions, k, temperatures in window_temperatures(run, kmin, kmax, tm_low, tm_high):
+            for position, value in zip((positions + offset).tolist(), temperatures.tolist()):
+                yield position, k, value
+
+
+def design_probes(target, kmin, kmax, tm_low, tm_high, top=10, tm_target=None):
+    """
+        Description: Best oligos of the target, ranked by distance to the target
+        temperature. Only the best top candidates are held at any time
+
+        Returns: List of (distance, position, length, temperature, sequence) tuples,
+            closest first
+
+        Input: target - 3' strand, kmin, kmax - oligo lengths, tm_low, tm_high - range
+            in Kelvin, top - number of results, tm_target - preferred temperature,
+            the middle of the range when not given
+    """
+    if tm_target is None:
+        tm_target = (tm_low + tm_high) / 2
+    codes = normalize(target.encode()) if isinstance(target, str) else numpy.asarray(target, dtype=numpy.uint8)
+    # max-heap of the best candidates so far (negated distance), shorter oligos win ties
+    best = []
+    for position, length, value in design_candidates(codes, kmin, kmax, tm_low, tm_high):
+        entry = (-abs(value - tm_target), -length, -position, value)
+        if len(best) < top:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+    results = []
+    for distance, length, position, value in sorted(best, reverse=True):
+        position, length = -position, -length
+        results.append((-distance, position, length, value, decode(codes[position:position + length])))
+    return results
+
+
+def design():
+    """
+        Description: REPL prompt for design_probes
+
+        Returns: Table of the best oligos of the entered target
+    """
+    print("Enter the target 3' strand, enter nothing, 'quit' or q to finish")
+    target = input(">> ").strip()
+    while target != "" and target != "quit" and target != "q":
+        try:
+            kmin, kmax = [int(value) for value in input("Lengths (min max): ").split()]
+            tm_low, tm_high = [float(value) for value in input("Temperature range in Kelvin (low high): ").split()]
+            top = int(input("Number of results (default 10): ").strip() or 10)
+            results = design_probes(target, kmin, kmax, tm_low, tm_high, top)
+        except ValueError as error:
+            print("Invalid Input: " + str(error))
+        else:
+            print("Position\tLength\tTemperature\tSequence")
+            for distance, position, length, value, sequence in results:
+                print(str(position) + "\t\t" + str(length) + "\t" + str(round(value, 2)) + "\t\t" + sequence)
+            if not results:
+                print("No oligo in range")
+        target = input(">> ").strip()
@@ -1,30 +1,105 @@
+import numpy
+
+from scripts.encoding import complement
+from scripts.encoding import pack
+from scripts.encoding import pack_codes
+from scripts.encoding import unpack
+from scripts.encoding import unpack_codes
+from scripts.energy import bases
+
 """
     Object for a DNA duplex
 """
 
 class Sequence(object):
-    """ Object that holds 3' and 5' sequence for DNA duplex """
+    """
+        Object that holds 3' and 5' sequence for DNA duplex
+
+        Strands are stored packed at 2 bits per base. When the 5' strand is the
+        exact complement of the 3' strand only the 3' strand is stored and the
+        5' strand is derived on access.
+    """
+
+    __slots__ = ("_three", "_five", "length", "energy", "enthalpy", "entropy",
+                 "temperature", "complementary", "oligo_molarity", "salt_molarity")
 
-    # Set all variables so we don't crash program by trying 
+    # Set all variables so we don't crash program by trying
     # to access a variable that hasn't be initialized
     def __init__(self, p3, p5, mol):
-        self.three_prime = p3
-        self.five_prime = p5
-        self.set_length(len(p3))
-        self.terminal = self.three_prime[self.length-1] + self.five_prime[self.length-1]
-        self.initial = self.three_prime[0] + self.five_prime[0]
+        self.set_three_prime(p3, p5)
+        self.oligo_molarity = mol
         self.energy = 0
         self.enthalpy = 0
         self.entropy = 0
 
+    @classmethod
+    def from_codes(cls, three, five=None, mol=.0004):
+        """
+            Description: Build a Sequence straight from base code arrays
+
+            Input: three - 3' base codes, five - 5' base codes (complement when not given)
+        """
+        s = cls.__new__(cls)
+        s._three = pack_codes(three)
+        if five is None or numpy.array_equal(numpy.asarray(five) ^ 3, three):
+            s._five = None
+        else:
+            s._five = pack_codes(five)
+        s.length = len(three)
+        s.oligo_molarity = mol
+        s.energy = 0
+        s.enthalpy = 0
+        s.entropy = 0
+        return s
+
+    """ Strands """
+
+    @property
+    def three_prime(self):
+        return unpack(self._three, self.length)
+
+    @three_prime.setter
+    def three_prime(self, seq):
+        self.set_three_prime(seq)
+
+    @property
+    def five_prime(self):
+        if self._five is None:
+            return complement(self.three_prime)
+        return unpack(self._five, self.length)
+
+    @five_prime.setter
+    def five_prime(self, seq):
+        self.set_five_prime(seq)
+
+    @property
+    def terminal(self):
+        return self.get_3(self.length - 1) + self.get_5(self.length - 1)
+
+    @property
+    def initial(self):
+        return self.get_3(0) + self.get_5(0)
+
     """ Setters """
 
-    def set_three_prime(self, seq):
-        self.three_prime = seq
+    # the 5' strand is kept unless a new one is given or the length changes, a
+    # strand of another length starts over as a perfectly matched duplex
+    def set_three_prime(self, seq, five=None):
+        if five is None and getattr(self, "_three", None) is not None and len(seq) == self.length:
+            five = self.five_prime
+        if five is not None and len(five) != len(seq):
+            raise ValueError("5' strand has to be as long as the 3' strand: " + five)
+        self._three = pack(seq)
         self.set_length(len(seq))
+        self._five = None if five is None or five == complement(seq) else pack(five)
 
     def set_five_prime(self, seq):
-        self.five_prime = seq
+        if len(seq) != self.length:
+            raise ValueError("5' strand has to be as long as the 3' strand: " + seq)
+        if seq == complement(self.three_prime):
+            self._five = None
+        else:
+            self._five = pack(seq)
 
     def set_complementary(self, comp):
         self.complementary = comp
@@ -44,7 +119,7 @@ class Sequence(object):
 
     def set_entropy(self, ent):
         self.entropy = ent
-    
+
     def set_length(self, l):
         self.length = l
 
@@ -71,18 +146,39 @@ class Sequence(object):
     """ Getters """
 
     def get_3(self, index):
-        return self.three_prime[index]
+        return bases[self._code(self._three, index)]
 
     def get_5(self, index):
-        return self.five_prime[index]
+        if self._five is None:
+            return bases[3 - self._code(self._three, index)]
+        return bases[self._code(self._five, index)]
+
+    # 2-bit code of a single base in a packed strand
+    def _code(self, packed, index):
+        if index < 0:
+            index += self.length
+        return (packed[index >> 2] >> (6 - ((index & 3) << 1))) & 3
 
     # get a sequence from 3' strand
     def get_3_s(self, start, finish):
-        return self.three_prime[start:finish]
+        return unpack(self._three, min(finish, self.length), start)
 
     # get a sequence from 5' strand
     def get_5_s(self, start, finish):
-        return self.five_prime[start:finish]
+        if self._five is None:
+            return complement(self.get_3_s(start, finish))
+        return unpack(self._five, min(finish, self.length), start)
+
+    # packed strands without copying, the 5' view is None for a perfect match
+    def get_packed(self):
+        return memoryview(self._three), None if self._five is None else memoryview(self._five)
+
+    # base codes (A=0, C=1, G=2, T=3) of both strands for the vectorized engine
+    def get_codes(self):
+        three = unpack_codes(self._three, self.length)
+        if self._five is None:
+            return three, 3 - three
+        return three, unpack_codes(self._five, self.length)
 
     def get_oligo_molarity(self):
         if self.complementary:
@@ -104,7 +200,7 @@ class Sequence(object):
 
     def get_entropy(self):
         return self.entropy
-    
+
     def get_length(self):
         return self.length
 
@@ -0,0 +1,134 @@
+import numpy
+
+from scripts.energy import bases
+
+"""
+    Conversion between base strings and the 2-bit integer codes used by the
+    vectorized engine (A=0, C=1, G=2, T=3)
+"""
+
+# byte value -> base code, 255 for characters that are not a base
+base_codes = numpy.full(256, 255, dtype=numpy.uint8)
+for code, base in enumerate(bases):
+    base_codes[ord(base)] = code
+
+# base code -> code of complementary base
+complement_codes = numpy.array([3, 2, 1, 0], dtype=numpy.uint8)
+
+
+def encode(strand):
+    """
+        Description: Encode a single strand as base codes
+
+        Returns: uint8 array with one code per base
+
+        Input: strand - string of A, C, G, T
+    """
+    codes = base_codes[numpy.frombuffer(strand.encode("ascii"), dtype=numpy.uint8)]
+    if (codes == 255).any():
+        raise ValueError("Strand contains characters other than A, C, G, T: " + strand)
+    return codes
+
+
+def encode_batch(strands):
+    """
+        Description: Encode strands of equal length into one matrix
+
+        Returns: uint8 array of shape (number of strands, length)
+
+        Input: strands - list of strings of A, C, G, T with the same length
+    """
+    strands = list(strands)
+    if not strands:
+        return numpy.zeros((0, 0), dtype=numpy.uint8)
+    length = len(strands[0])
+    joined = "".join(strands)
+    if len(joined) != length * len(strands):
+        raise ValueError("Strands in a batch must all have the same length")
+    return encode(joined).reshape(len(strands), length)
+
+
+def decode(codes):
+    """
+        Description: Decode base codes back to a string
+
+        Returns: String of A, C, G, T
+
+        Input: codes - array of base codes
+    """
+    return numpy.frombuffer(b"ACGT", dtype=numpy.uint8)[numpy.asarray(codes)].tobytes().decode("ascii")
+
+
+"""
+    2-bit packing: four bases per byte, first base in the two high bits. The
+    unused bits of the last byte are zero (A).
+"""
+
+_to_digits = str.maketrans("ACGT", "0123")
+_complement = str.maketrans("ACGT", "TGCA")
+_byte_bases = [bases[b >> 6] + bases[(b >> 4) & 3] + bases[(b >> 2) & 3] + bases[b & 3] for b in range(256)]
+_shifts = numpy.array([6, 4, 2, 0], dtype=numpy.uint8)
+
+
+def pack(strand):
+    """
+        Description: Pack a strand into 2 bits per base
+
+        Returns: bytes of length ceil(len(strand) / 4)
+
+        Input: strand - string of A, C, G, T
+    """
+    if strand.strip("ACGT"):
+        raise ValueError("Strand contains characters other than A, C, G, T: " + strand)
+    digits = strand.translate(_to_digits)
+    size = (len(strand) + 3) >> 2
+    return int(digits + "0" * (size * 4 - len(strand)), 4).to_bytes(size, "big")
+
+
+def pack_codes(codes):
+    """
+        Description: Pack base codes into 2 bits per base
+
+        Returns: bytes in the same layout as pack
+
+        Input: codes - uint8 array of base codes
+    """
+    codes = numpy.asarray(codes, dtype=numpy.uint8)
+    padded = numpy.zeros(((len(codes) + 3) >> 2) * 4, dtype=numpy.uint8)
+    padded[:len(codes)] = codes
+    return numpy.bitwise_or.reduce(padded.reshape(-1, 4) << _shifts, axis=1).astype(numpy.uint8).tobytes()
+
+
+def unpack(packed, length, start=0):
+    """
+        Description: Decode part of a packed strand
+
+        Returns: String of the bases from start up to length
+
+        Input: packed - packed strand, length - index one past the last base wanted,
+            start - first base wanted
+    """
+    first = start >> 2
+    decoded = "".join(map(_byte_bases.__getitem__, packed[first:(length + 3) >> 2]))
+    return decoded[start - (first << 2):length - (first << 2)]
+
+
+def unpack_codes(packed, length):
+    """
+        Description: Unpack a packed strand (or a batch of them) to base codes
+
+        Returns: uint8 array of codes, shape (length,) or (n, length)
+
+        Input: packed - bytes-like packed strand, or uint8 array of shape (n, bytes)
+            holding packed strands of the same length
+    """
+    packed = numpy.frombuffer(packed, dtype=numpy.uint8) if not isinstance(packed, numpy.ndarray) else packed
+    codes = (packed[..., None] >> _shifts) & 3
+    return codes.reshape(packed.shape[:-1] + (-1,))[..., :length]
+
+
+def complement(strand):
+    """
+        Description: Complementary strand, base for base
+    """
+    return strand.translate(_complement)
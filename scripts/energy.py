@@ -3,6 +3,10 @@
     symmetry, and initial base pair
 """
 
+import hashlib
+
+import numpy
+
 """
     All possible base pairs delta G energy from
     https://en.wikipedia.org/wiki/Nucleic_acid_thermodynamics
@@ -130,38 +134,120 @@ initial_energy = {
 }
 
 
-def get_initiation_energy(init_pair, term_pair, comp):
-    """
-        Description: Find energy contribution of head and tail base pairs in DNA sequence
+"""
+    Compiled tables. Bases are coded A=0, C=1, G=2, T=3, a base pair is indexed by
+    (3' code << 2) | 5' code and a dimer by (3' first << 6) | (3' second << 4) |
+    (5' first << 2) | 5' second. Both orientations of every dimer are resolved
+    here once, so a lookup is a single array index. Values are also kept in
+    integer hundredths for the vectorized engine.
+"""
 
-        Returns: Total energy, enthalpy, and entropy contribution
+bases = "ACGT"
 
-        Input: init_pair - initial base pair, term_pair - terminal base pair, 
-            comp - sentinal to specifcy complementarity
+# identifies this parameter set, stored results computed with other tables are ignored
+parameter_version = hashlib.sha1(repr((nearest_neighbor_energy, nearest_neighbor_mismatch_energy,
+                                       initial_energy)).encode()).hexdigest()[:16]
+
+base_index = {base: code for code, base in enumerate(bases)}
+
+# dimer kinds
+UNSUPPORTED = 0
+MATCH = 1
+MISMATCH = 2
+
+
+class NearestNeighborError(ValueError):
+    """ Raised when a dimer has no nearest neighbor parameters """
+
+    def __init__(self, pair_one, pair_two, kind):
+        self.pair_one = pair_one
+        self.pair_two = pair_two
+        self.kind = kind
+        super(NearestNeighborError, self).__init__(
+            kind + " sequence: " + pair_one + "/" + pair_two + " not found")
+
+
+def hundredths(values):
+    """
+        Description: Convert energy values to integer hundredths
     """
-    total = [0.0, 0.0, 0.0]
+    return [int(round(v * 100)) for v in values]
+
+
+def dimer_index(pair_one, pair_two):
     """
-        Check if initial is A-T or G-C base pair
+        Description: Table index of a dimer given as 3' and 5' strings (e.g. AC, TG)
     """
-    if init_pair == "AT" or init_pair == "TA":
-        add(total, initial_energy["AT"])
-    elif init_pair == "GC" or init_pair == "CG":
-        add(total, initial_energy["CG"])
+    return ((base_index[pair_one[0]] << 6) | (base_index[pair_one[1]] << 4)
+            | (base_index[pair_two[0]] << 2) | base_index[pair_two[1]])
 
+
+def pair_index(pair):
     """
-        Check if terminal pair is A-T or G-C base pair 
+        Description: Table index of a base pair given as a 3' + 5' string (e.g. AT)
     """
-    if term_pair == "AT" or term_pair == "TA":
-        add(total, initial_energy["AT"])
-    elif term_pair == "CG" or term_pair == "GC":
-        add(total, initial_energy["CG"])
+    return (base_index[pair[0]] << 2) | base_index[pair[1]]
+
+
+def _compile_dimers():
+    kind = numpy.zeros(256, dtype=numpy.uint8)
+    inverse = numpy.zeros(256, dtype=numpy.bool_)
+    entries = [None] * 256
+    for index in range(256):
+        pair_one = bases[index >> 6] + bases[(index >> 4) & 3]
+        pair_two = bases[(index >> 2) & 3] + bases[index & 3]
+        # matched dimers when both base pairs are complementary (codes add up to 3)
+        if (index >> 6) + ((index >> 2) & 3) == 3 and ((index >> 4) & 3) + (index & 3) == 3:
+            table, dimer_kind = nearest_neighbor_energy, MATCH
+        else:
+            table, dimer_kind = nearest_neighbor_mismatch_energy, MISMATCH
+        regular = pair_one + pair_two
+        reverse = pair_two[1] + pair_two[0] + pair_one[1] + pair_one[0]
+        if regular in table:
+            entries[index] = table[regular]
+        # if sequence isn't found we use its inverse (e. g. TC/AG == GA/CT)
+        elif reverse in table:
+            entries[index] = table[reverse]
+            inverse[index] = True
+        else:
+            continue
+        kind[index] = dimer_kind
+    params = numpy.array([hundredths(e) if e else [0, 0, 0] for e in entries], dtype=numpy.int64)
+    return kind, inverse, entries, params
+
+
+def _compile_ends():
+    initial = numpy.zeros((16, 3), dtype=numpy.int64)
+    terminal = numpy.zeros((16, 3), dtype=numpy.int64)
+    for index in range(16):
+        pair = bases[index >> 2] + bases[index & 3]
+        if pair == "AT" or pair == "TA":
+            initial[index] = hundredths(initial_energy["AT"])
+        elif pair == "GC" or pair == "CG":
+            initial[index] = hundredths(initial_energy["CG"])
+        terminal[index] = initial[index]
+        # terminal 3'->5' A-T
+        if pair == "AT":
+            terminal[index] += hundredths(initial_energy["TERM_AT"])
+    return initial, terminal
+
+
+dimer_kind, dimer_inverse, dimer_entries, dimer_params = _compile_dimers()
+initial_params, terminal_params = _compile_ends()
+symmetry_params = numpy.array(hundredths(initial_energy["SYM"]), dtype=numpy.int64)
+
 
+def get_initiation_energy(init_pair, term_pair, comp):
     """
-        Check for terminal 3'->5' A-T
+        Description: Find energy contribution of head and tail base pairs in DNA sequence
+
+        Returns: Total energy, enthalpy, and entropy contribution
+
+        Input: init_pair - initial base pair, term_pair - terminal base pair, 
+            comp - sentinal to specifcy complementarity
     """
-    if term_pair == "AT":
-        add(total, initial_energy["TERM_AT"]) 
-    return total
+    total = initial_params[pair_index(init_pair)] + terminal_params[pair_index(term_pair)]
+    return [int(value) / 100 for value in total]
 
 
 def get_symmetry_g(sym):
@@ -185,16 +271,10 @@ def get_nearest_neighbor_energy(pair_one, pair_two):
 
         Input: pair_one - first base pair, pair_two - second, adjacent base pair
     """
-    regular = pair_one + pair_two
-    inverse = pair_two[1] + pair_two[0] + pair_one[1] + pair_one[0]
-
-    if regular in nearest_neighbor_energy:
-        return nearest_neighbor_energy[regular]
-    # if sequence isn't found we use its inverse (e. g. TC/AG == GA/CT)
-    elif inverse in nearest_neighbor_energy:
-        return nearest_neighbor_energy[inverse]
-    else:
-        print("Nearest neighbor sequence: " + str(regular) + "not found")
+    index = dimer_index(pair_one, pair_two)
+    if dimer_kind[index] != MATCH:
+        raise NearestNeighborError(pair_one, pair_two, "Nearest neighbor")
+    return dimer_entries[index]
 
 
 def get_nearest_neighbor_mismatch_energy(pair_one, pair_two):
@@ -205,15 +285,10 @@ def get_nearest_neighbor_mismatch_energy(pair_one, pair_two):
 
         Input: pair_one - first base pair, pair_two - second, adjacent base pair
     """
-    regular = pair_one + pair_two
-    inverse = pair_two[1] + pair_two[0] + pair_one[1] + pair_one[0]
-    if regular in nearest_neighbor_mismatch_energy:
-        return nearest_neighbor_mismatch_energy[regular]
-    # look for equivalent inverse sequence (e.g. TCT/AGC == CGA/TCT)
-    elif inverse in nearest_neighbor_mismatch_energy:
-        return nearest_neighbor_mismatch_energy[inverse]
-    else:
-        print("Mismatch sequence: " + str(regular) + "not found")
+    index = dimer_index(pair_one, pair_two)
+    if dimer_kind[index] != MISMATCH:
+        raise NearestNeighborError(pair_one, pair_two, "Mismatch")
+    return dimer_entries[index]
 
 
 def add(t1, t2):
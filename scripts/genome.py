@@ -3,8 +3,28 @@ from scripts.energy import get_initiation_energy as i_energy
 from scripts.energy import get_nearest_neighbor_energy as nn_energy
 from scripts.energy import get_nearest_neighbor_mismatch_energy as nn_mm_energy
 from scripts.energy import get_symmetry_g as get_sym
+from scripts.energy import bases
+from scripts.energy import dimer_index
+from scripts.energy import dimer_inverse
+from scripts.energy import dimer_kind
+from scripts.energy import dimer_params
+from scripts.energy import initial_params
+from scripts.energy import symmetry_params
+from scripts.energy import terminal_params
+from scripts.energy import MISMATCH
+from scripts.energy import NearestNeighborError
+from scripts.encoding import encode
+from scripts.encoding import encode_batch
+from scripts.encoding import unpack_codes
+from scripts.ingest import read_sample
+from scripts.ingest import to_sequence
+from scripts import instrument
+from scripts.palindrome import SymmetryIndex
 
 import math
+import numpy
+import os
+import time
 
 """
     Parses and finds temperature for dna strand. This is the base function of the 
@@ -21,25 +41,61 @@ def find_melting_temperature(s):
 
         Input:Sequence object with strand information
     """
+    # timers and lookup counters are only taken while instrument.enabled is set, it is
+    # read once per call; with profiling off every phase boundary of the loop still
+    # tests the local flag (four tests per dimer), but no clock is read
+    profiling = instrument.enabled
+    if profiling:
+        clock = time.perf_counter
+        begin = clock()
+        symmetry = match = mismatch = adding = 0.0
+        matches = mismatches = inverse = 0
+
     s.set_complementary(True)
     seq_len = s.length
+    # strands are stored packed, decode them once rather than base by base
+    three = s.three_prime
+    five = s.five_prime
     for x in range(seq_len - 1):
+        if profiling:
+            start = clock()
         # check for symmetry
-        if(s.get_3(x) + s.get_5(x) != s.get_5(seq_len - 1 - x) + s.get_3(seq_len- 1 - x)):
+        if(three[x] + five[x] != five[seq_len - 1 - x] + three[seq_len - 1 - x]):
             s.set_complementary(False)
+        if profiling:
+            checked = clock()
+            symmetry += checked - start
+        three_dimer = three[x:x + 2]
+        five_dimer = five[x:x + 2]
         # find complementary base pair nearest neighbor energy
-        if is_complement(s.get_5(x +1), s.get_3(x +1)) and is_complement(s.get_3(x), s.get_5(x)):
-            s.add(nn_energy(s.get_3_s(x,x + 2), s.get_5_s(x, x + 2)))
+        if is_complement(five[x + 1], three[x + 1]) and is_complement(three[x], five[x]):
+            value = nn_energy(three_dimer, five_dimer)
+            if profiling:
+                found = clock()
+                match += found - checked
+                matches += 1
         # look for base pair inverse mismatch value
         else:
-            s.add(nn_mm_energy( s.get_3_s(x, x + 2), s.get_5_s(x, x + 2)))
+            value = nn_mm_energy(three_dimer, five_dimer)
             s.set_complementary(False)
+            if profiling:
+                found = clock()
+                mismatch += found - checked
+                mismatches += 1
+        s.add(value)
+        if profiling:
+            adding += clock() - found
+            inverse += bool(dimer_inverse[dimer_index(three_dimer, five_dimer)])
 
+    if profiling:
+        start = clock()
     # if s is symmetrical, add symmetry value
     s.add(get_sym(s.get_complementary()))
 
     # calculate energy values of first pair ignoring nearest neighbor
-    s.add(i_energy(s.get_initial(), s.get_terminal(), s.get_complementary()))
+    s.add(i_energy(three[0] + five[0], three[-1] + five[-1], s.get_complementary()))
+    if profiling:
+        initiated = clock()
 
     # Account for Other factors that will affect temperature/gibbs energy
 
@@ -57,9 +113,394 @@ def find_melting_temperature(s):
     R = 1.987
     s.set_temperature((s.get_enthalpy()*1000) / (s.get_entropy() + (R * math.log(s.get_oligo_molarity() , math.exp(1)))))
 
+    if profiling:
+        end = clock()
+        instrument.add_time("scalar.symmetry", symmetry)
+        instrument.add_time("scalar.lookup.match", match)
+        instrument.add_time("scalar.lookup.mismatch", mismatch)
+        instrument.add_time("scalar.add", adding)
+        instrument.add_time("scalar.initiation", initiated - start)
+        instrument.add_time("scalar.temperature", end - initiated)
+        instrument.add_time("scalar.total", end - begin)
+        instrument.count("scalar.sequences")
+        instrument.count("lookups.match", matches)
+        instrument.count("lookups.mismatch", mismatches)
+        instrument.count("lookups.inverse", inverse)
     return s
 
 
+"""
+    Vectorized engine. Strands are encoded as 2-bit base codes (A=0, C=1, G=2, T=3)
+    and every parameter is kept in integer hundredths so that summing a whole
+    duplex at once gives exactly the values the rounded, step by step additions
+    of Sequence.add give.
+"""
+
+# gas constant and the oligonucleotide molarity term for self-complementary (1E-4)
+# and all other (4E-4) duplexes, as in find_melting_temperature
+R = 1.987
+complementary_molarity_term = R * math.log(0.0001, math.exp(1))
+molarity_term = R * math.log(0.0004, math.exp(1))
+
+
+def molarity_terms(oligo_molarity=None):
+    """
+        Description: Molarity terms of the temperature formula for an oligonucleotide
+        concentration. Self-complementary duplexes use a quarter of it, as the default
+        4E-4 and 1E-4
+
+        Returns: (self-complementary term, other term)
+    """
+    if oligo_molarity is None:
+        return complementary_molarity_term, molarity_term
+    if oligo_molarity <= 0:
+        raise ValueError("Oligonucleotide concentration has to be positive")
+    return R * math.log(oligo_molarity / 4, math.exp(1)), R * math.log(oligo_molarity, math.exp(1))
+
+# Result layout of find_melting_temperatures
+melting_dtype = numpy.dtype([
+    ("length", numpy.int32),
+    ("energy", numpy.float64),
+    ("enthalpy", numpy.float64),
+    ("entropy", numpy.float64),
+    ("temperature", numpy.float64),
+    ("complementary", numpy.bool_)
+])
+
+
+def temperature(enthalpy, entropy, complementary):
+    """
+        Description: Melting temperature from enthalpy and entropy in hundredths
+    """
+    return (enthalpy / 100 * 1000) / (entropy / 100 + (complementary_molarity_term if complementary else molarity_term))
+
+
+def find_melting_temperatures(three_primes, five_primes, symmetric=None, oligo_molarity=None):
+    """
+        Description: Batch version of find_melting_temperature, evaluating all
+        duplexes with NumPy instead of one Sequence at a time
+
+        Returns: Structured array (melting_dtype) with length, energy, enthalpy,
+            entropy, temperature and complementary flag for every duplex
+
+        Input: three_primes, five_primes - lists of strand strings (lengths may
+            differ between duplexes) or uint8 code matrices of shape (n, length),
+            symmetric - optional symmetry flag of every duplex (e.g. from a
+            SymmetryIndex), checked per duplex when not given, oligo_molarity -
+            oligonucleotide concentration (4E-4 when not given, see molarity_terms)
+    """
+    if isinstance(three_primes, numpy.ndarray):
+        return _evaluate_codes(three_primes, five_primes, symmetric, oligo_molarity)
+
+    three_primes = list(three_primes)
+    five_primes = list(five_primes)
+    if len(three_primes) != len(five_primes):
+        raise ValueError("Number of 3' and 5' strands differ")
+
+    # group duplexes of the same length so each group is one matrix
+    groups = {}
+    for x, strand in enumerate(three_primes):
+        if len(strand) != len(five_primes[x]):
+            raise ValueError("Strands of duplex " + str(x) + " have different lengths")
+        groups.setdefault(len(strand), []).append(x)
+
+    results = numpy.zeros(len(three_primes), dtype=melting_dtype)
+    for indices in groups.values():
+        three = encode_batch(three_primes[x] for x in indices)
+        five = encode_batch(five_primes[x] for x in indices)
+        results[indices] = _evaluate_codes(three, five, None if symmetric is None else
+                                           numpy.asarray(symmetric, dtype=bool)[indices], oligo_molarity)
+    return results
+
+
+def evaluate_sequences(sequences):
+    """
+        Description: Batch version of find_melting_temperature for Sequence objects,
+        reading the packed strands directly
+
+        Returns: The Sequence objects with energy, enthalpy, entropy, temperature and
+            complementary values set
+
+        Input: sequences - list of Sequence objects
+    """
+    groups = {}
+    for sequence in sequences:
+        groups.setdefault(sequence.length, []).append(sequence)
+
+    for length, group in groups.items():
+        three = unpack_codes(numpy.frombuffer(b"".join(s.get_packed()[0] for s in group), dtype=numpy.uint8)
+                             .reshape(len(group), -1), length)
+        five = three ^ 3
+        for x, s in enumerate(group):
+            packed_five = s.get_packed()[1]
+            if packed_five is not None:
+                five[x] = unpack_codes(packed_five, length)
+        results = _evaluate_codes(three, five)
+        for x, s in enumerate(group):
+            s.set_energy(float(results["energy"][x]))
+            s.set_enthalpy(float(results["enthalpy"][x]))
+            s.set_entropy(float(results["entropy"][x]))
+            s.set_temperature(float(results["temperature"][x]))
+            s.set_complementary(bool(results["complementary"][x]))
+    return sequences
+
+
+def _evaluate_codes(three, five, symmetric=None, oligo_molarity=None):
+    """
+        Description: Nearest neighbor evaluation of encoded duplexes of one length
+
+        Input: three, five - uint8 code matrices of shape (n, length), symmetric -
+            optional symmetry flag per duplex, oligo_molarity - oligonucleotide
+            concentration
+    """
+    complementary_term, term = molarity_terms(oligo_molarity)
+    three = numpy.asarray(three, dtype=numpy.intp)
+    five = numpy.asarray(five, dtype=numpy.intp)
+    if three.shape != five.shape or three.ndim != 2:
+        raise ValueError("3' and 5' code matrices must have the same (n, length) shape")
+    count, length = three.shape
+    results = numpy.zeros(count, dtype=melting_dtype)
+    if count == 0:
+        return results
+    if length < 1:
+        raise ValueError("Duplexes must have at least one base pair")
+    if max(three.max(), five.max()) > 3:
+        raise ValueError("Duplexes contain ambiguous bases")
+
+    profiling = instrument.enabled
+    if profiling:
+        begin = time.perf_counter()
+
+    dimers = (three[:, :-1] << 6) | (three[:, 1:] << 4) | (five[:, :-1] << 2) | five[:, 1:]
+    kinds = dimer_kind[dimers]
+    if (kinds == 0).any():
+        row, column = numpy.argwhere(kinds == 0)[0]
+        raise NearestNeighborError(bases[three[row, column]] + bases[three[row, column + 1]],
+                                   bases[five[row, column]] + bases[five[row, column + 1]], "Nearest neighbor")
+    totals = dimer_params[dimers].sum(axis=1)
+    if profiling:
+        looked_up = time.perf_counter()
+
+    # symmetry: 3'[x] 5'[x] must mirror 5'[n-1-x] 3'[n-1-x]
+    if symmetric is not None:
+        symmetric = numpy.asarray(symmetric, dtype=bool)
+        if symmetric.shape != (count,):
+            raise ValueError("One symmetry flag per duplex is required")
+    else:
+        symmetric = ((three[:, :length - 1] == five[:, ::-1][:, :length - 1]).all(axis=1)
+                     & (five[:, :length - 1] == three[:, ::-1][:, :length - 1]).all(axis=1))
+    complementary = symmetric & ~(kinds == MISMATCH).any(axis=1)
+    if profiling:
+        checked = time.perf_counter()
+
+    totals += complementary[:, None] * symmetry_params
+    totals += initial_params[(three[:, 0] << 2) | five[:, 0]]
+    totals += terminal_params[(three[:, -1] << 2) | five[:, -1]]
+    if profiling:
+        initiated = time.perf_counter()
+
+    results["length"] = length
+    results["enthalpy"] = totals[:, 0] / 100
+    results["entropy"] = totals[:, 1] / 100
+    results["energy"] = totals[:, 2] / 100
+    results["complementary"] = complementary
+    results["temperature"] = (results["enthalpy"] * 1000) / (
+        results["entropy"] + numpy.where(complementary, complementary_term, term))
+
+    if profiling:
+        end = time.perf_counter()
+        instrument.add_time("batch.lookup", looked_up - begin)
+        instrument.add_time("batch.symmetry", checked - looked_up)
+        instrument.add_time("batch.initiation", initiated - checked)
+        instrument.add_time("batch.temperature", end - initiated)
+        instrument.add_time("batch.total", end - begin)
+        instrument.count("batch.sequences", count)
+        mismatch_count = int((kinds == MISMATCH).sum())
+        instrument.count("lookups.match", kinds.size - mismatch_count)
+        instrument.count("lookups.mismatch", mismatch_count)
+        instrument.count("lookups.inverse", int(dimer_inverse[dimers].sum()))
+    return results
+
+
+def evaluate_duplex(three_prime, five_prime=None):
+    """
+        Description: Evaluate a duplex once and keep the contribution of every dimer so
+        single base substitutions can be scored without evaluating it again
+
+        Returns: Dictionary with the strand codes, per dimer contributions, totals (in
+            hundredths), complementary and perfectly matched flags and temperature
+
+        Input: three_prime - 3' strand, five_prime - 5' strand (complement when not given)
+    """
+    three = encode(three_prime) if isinstance(three_prime, str) else numpy.asarray(three_prime, dtype=numpy.uint8)
+    if five_prime is None:
+        five = three ^ 3
+    else:
+        five = encode(five_prime) if isinstance(five_prime, str) else numpy.asarray(five_prime, dtype=numpy.uint8)
+    result = _evaluate_codes(three[None], five[None])[0]
+
+    wide_three = three.astype(numpy.intp)
+    wide_five = five.astype(numpy.intp)
+    dimers = dimer_params[(wide_three[:-1] << 6) | (wide_three[1:] << 4) | (wide_five[:-1] << 2) | wide_five[1:]]
+    totals = dimers.sum(axis=0) + initial_params[(three[0] << 2) | five[0]] + terminal_params[(three[-1] << 2) | five[-1]]
+    if result["complementary"]:
+        totals += symmetry_params
+    return {
+        "three": three.tolist(),
+        "five": five.tolist(),
+        "dimers": dimers.tolist(),
+        "totals": totals.tolist(),
+        "complementary": bool(result["complementary"]),
+        "matched": bool(((three ^ five) == 3).all()),
+        "temperature": float(result["temperature"])
+    }
+
+
+def mismatch_difference(evaluation, index, base):
+    """
+        Description: Change in melting temperature when the 3' base at index is replaced,
+        in constant time. Only the (at most two) dimers around index and, at the ends,
+        the initiation terms change; the symmetry term is dropped since the substituted
+        duplex has a mismatch.
+
+        Returns: Temperature of the substituted duplex minus temperature of the original
+
+        Input: evaluation - result of evaluate_duplex on a perfectly matched duplex,
+            index - position of the substitution, base - new 3' base (letter or code)
+    """
+    if not evaluation["matched"]:
+        raise ValueError("Substitutions can only be scored on a perfectly matched duplex")
+    three = evaluation["three"]
+    five = evaluation["five"]
+    length = len(three)
+    code = bases.index(base) if isinstance(base, str) else int(base)
+    if length < 2 or code == three[index] or code + five[index] == 3:
+        raise ValueError("Substitution has to create a mismatch in a duplex of at least two base pairs")
+
+    h, e = evaluation["totals"][0], evaluation["totals"][1]
+    if evaluation["complementary"]:
+        h -= int(symmetry_params[0])
+        e -= int(symmetry_params[1])
+    if index > 0:
+        new = (three[index - 1] << 6) | (code << 4) | (five[index - 1] << 2) | five[index]
+        h, e = _replace_dimer(evaluation, index - 1, new, h, e)
+    if index < length - 1:
+        new = (code << 6) | (three[index + 1] << 4) | (five[index] << 2) | five[index + 1]
+        h, e = _replace_dimer(evaluation, index, new, h, e)
+    if index == 0:
+        h += int(initial_params[(code << 2) | five[0]][0] - initial_params[(three[0] << 2) | five[0]][0])
+        e += int(initial_params[(code << 2) | five[0]][1] - initial_params[(three[0] << 2) | five[0]][1])
+    if index == length - 1:
+        h += int(terminal_params[(code << 2) | five[-1]][0] - terminal_params[(three[-1] << 2) | five[-1]][0])
+        e += int(terminal_params[(code << 2) | five[-1]][1] - terminal_params[(three[-1] << 2) | five[-1]][1])
+    return temperature(h, e, False) - evaluation["temperature"]
+
+
+def scan_mismatches(three_prime, five_prime=None):
+    """
+        Description: Saturation mutagenesis, change in melting temperature for every inner
+        position and every other 3' base (3(L - 2) variants) in one vectorized pass
+
+        Returns: Array of shape (length, 4), entry [i, b] is the temperature change when
+            the 3' base at i becomes base code b (A=0, C=1, G=2, T=3). The original base,
+            both end positions and contexts without parameters are NaN
+
+        Input: three_prime - 3' strand of a perfectly matched duplex, five_prime - 5'
+            strand (complement when not given)
+    """
+    evaluation = evaluate_duplex(three_prime, five_prime)
+    if not evaluation["matched"]:
+        raise ValueError("Saturation mutagenesis needs a perfectly matched duplex")
+    three = numpy.array(evaluation["three"], dtype=numpy.intp)
+    five = numpy.array(evaluation["five"], dtype=numpy.intp)
+    length = len(three)
+    differences = numpy.full((length, 4), numpy.nan)
+    if length < 3:
+        return differences
+
+    old = numpy.array(evaluation["dimers"], dtype=numpy.int64)
+    new_bases = numpy.arange(4)[None, :]
+    left = (three[:-2, None] << 6) | (new_bases << 4) | (five[:-2, None] << 2) | five[1:-1, None]
+    right = (new_bases << 6) | (three[2:, None] << 4) | (five[1:-1, None] << 2) | five[2:, None]
+
+    totals = numpy.array(evaluation["totals"][:2], dtype=numpy.int64)
+    if evaluation["complementary"]:
+        totals -= symmetry_params[:2]
+    changed = dimer_params[left][..., :2] + dimer_params[right][..., :2] - (old[:-1] + old[1:])[:, None, :2]
+    h = totals[0] + changed[..., 0]
+    e = totals[1] + changed[..., 1]
+    inner = (h / 100 * 1000) / (e / 100 + molarity_term) - evaluation["temperature"]
+
+    valid = (dimer_kind[left] != 0) & (dimer_kind[right] != 0) & (new_bases != three[1:-1, None])
+    differences[1:-1] = numpy.where(valid, inner, numpy.nan)
+    return differences
+
+
+def _replace_dimer(evaluation, position, new, h, e):
+    if not dimer_kind[new]:
+        raise NearestNeighborError(bases[new >> 6] + bases[(new >> 4) & 3],
+                                   bases[(new >> 2) & 3] + bases[new & 3], "Mismatch")
+    old = evaluation["dimers"][position]
+    return h - old[0] + int(dimer_params[new][0]), e - old[1] + int(dimer_params[new][1])
+
+
+def scan_melting_temperatures(three_prime, k, five_prime=None):
+    """
+        Description: Slide a window of k base pairs along a long duplex and find the
+        melting temperature of every window. Nearest neighbor contributions are
+        prefix summed so each step costs constant time and symmetry is read from a
+        SymmetryIndex built once for the whole duplex.
+
+        Returns: Generator of (position, enthalpy, entropy, temperature) tuples
+
+        Input: three_prime - 3' strand (string or base codes), k - window length,
+            five_prime - 5' strand, the complement of three_prime when not given
+    """
+    three = encode(three_prime) if isinstance(three_prime, str) else numpy.asarray(three_prime, dtype=numpy.uint8)
+    if five_prime is None:
+        five = three ^ 3
+    else:
+        five = encode(five_prime) if isinstance(five_prime, str) else numpy.asarray(five_prime, dtype=numpy.uint8)
+    if len(three) != len(five):
+        raise ValueError("Strands have different lengths")
+    if len(three) and max(three.max(), five.max()) > 3:
+        raise ValueError("Strands contain ambiguous bases, scan each unambiguous run separately")
+    if k < 1 or k > len(three):
+        raise ValueError("Window length has to be between 1 and the strand length")
+
+    wide_three = three.astype(numpy.intp)
+    wide_five = five.astype(numpy.intp)
+    dimers = (wide_three[:-1] << 6) | (wide_three[1:] << 4) | (wide_five[:-1] << 2) | wide_five[1:]
+    kinds = dimer_kind[dimers]
+
+    # prefix sums over dimers: window at p covers dimers p .. p + k - 2
+    params = numpy.zeros((len(dimers) + 1, 3), dtype=numpy.int64)
+    numpy.cumsum(dimer_params[dimers], axis=0, out=params[1:])
+    mismatches = numpy.concatenate(([0], numpy.cumsum(kinds == MISMATCH))).tolist()
+    unsupported = numpy.concatenate(([0], numpy.cumsum(kinds == 0))).tolist()
+    enthalpy, entropy = params[:, 0].tolist(), params[:, 1].tolist()
+    initial = initial_params[(wide_three << 2) | wide_five][:, :2].tolist()
+    terminal = terminal_params[(wide_three << 2) | wide_five][:, :2].tolist()
+
+    symmetric = SymmetryIndex(three, five).symmetric(k).tolist()
+
+    sym_enthalpy, sym_entropy = int(symmetry_params[0]), int(symmetry_params[1])
+
+    for p in range(len(three) - k + 1):
+        end = p + k - 1
+        if unsupported[end] != unsupported[p]:
+            column = p + unsupported[p:end + 1].index(unsupported[p] + 1) - 1
+            raise NearestNeighborError(bases[three[column]] + bases[three[column + 1]],
+                                       bases[five[column]] + bases[five[column + 1]], "Nearest neighbor")
+        h = enthalpy[end] - enthalpy[p] + initial[p][0] + terminal[end][0]
+        e = entropy[end] - entropy[p] + initial[p][1] + terminal[end][1]
+        complementary = symmetric[p] and mismatches[end] == mismatches[p]
+        if complementary:
+            h += sym_enthalpy
+            e += sym_entropy
+        yield (p, h / 100, e / 100) + (temperature(h, e, complementary),)
+
+
 def parse_genome(number):
     """
        Description: Creates DNA sequence for 5'->3' and 3'->5' strand
@@ -68,27 +509,15 @@ def parse_genome(number):
 
        Input: Number of DNA sample file to read from
     """
-    prime_5 = ""
-    prime_3 = ""
-
-    if int(number) > 15 or int(number) < 0:
-        raise ValueError("Number has to be less than 15 and greater than 0")
+    if int(number) < 1:
+        raise ValueError("Number has to be greater than 0")
 
-    with open("dna_samples/dna_sample_" + str(number) + ".txt") as f:
-        seq = f.read()
-    seq = seq.split()
-    even = True
+    path = "dna_samples/dna_sample_" + str(int(number)) + ".txt"
+    if not os.path.exists(path):
+        raise ValueError("No sample file " + path)
 
-    for x in range(len(seq)):
-        if seq[x] != '/n' and seq[x] != ' ':
-            if even:
-                prime_3 += seq[x]
-                even = False
-            else:
-                prime_5 += seq[x]
-                even = True
-
-    return Sequence(prime_3, prime_5, .0004)
+    three, five = read_sample(path)
+    return to_sequence(three, five)
 
 def is_complement(b1, b2):
     """ 
@@ -101,3 +530,4 @@ def is_complement(b1, b2):
     return False
 
 
+
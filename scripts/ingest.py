@@ -0,0 +1,139 @@
+import mmap
+
+import numpy
+
+from scripts.duplex import Sequence
+
+"""
+    Streaming readers for FASTA/FASTQ files and the two column sample files. Files
+    are memory mapped and each record is normalized with one bytes.translate call:
+    upper and lower case bases map to their codes (A=0, C=1, G=2, T/U=3), IUPAC
+    ambiguity codes and N map to N_CODE and whitespace is removed.
+"""
+
+N_CODE = 4
+INVALID_CODE = 255
+
+_normalize = bytearray([INVALID_CODE]) * 256
+for _code, _letters in enumerate(["Aa", "Cc", "Gg", "TtUu"]):
+    for _letter in _letters:
+        _normalize[ord(_letter)] = _code
+for _letter in "RYKMSWBDHVNrykmswbdhvn-.":
+    _normalize[ord(_letter)] = N_CODE
+_normalize = bytes(_normalize)
+_whitespace = b" \t\r\n"
+
+
+def normalize(raw):
+    """
+        Description: Convert raw sequence bytes to base codes
+
+        Returns: uint8 array of codes (N_CODE for ambiguous bases)
+
+        Input: raw - bytes of sequence text, may contain line breaks
+    """
+    codes = numpy.frombuffer(raw.translate(_normalize, _whitespace), dtype=numpy.uint8)
+    if codes.size and codes.max() == INVALID_CODE:
+        bad = raw.translate(None, _whitespace)[int(numpy.argmax(codes == INVALID_CODE))]
+        raise ValueError("Character not recognized in sequence: " + chr(bad))
+    return codes
+
+
+def read_records(path):
+    """
+        Description: Stream the records of a FASTA or FASTQ file without reading
+        the whole file
+
+        Returns: Generator of (name, codes) tuples
+
+        Input: path - FASTA (records start with '>') or FASTQ ('@') file
+    """
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:1] == b">":
+                for record in _fasta_records(mm):
+                    yield record
+            elif mm[:1] == b"@":
+                for record in _fastq_records(mm):
+                    yield record
+            else:
+                raise ValueError(str(path) + " is not a FASTA or FASTQ file")
+
+
+def _fasta_records(mm):
+    start = 0
+    size = len(mm)
+    while start < size:
+        header_end = mm.find(b"\n", start)
+        if header_end == -1:
+            header_end = size
+        end = mm.find(b"\n>", header_end)
+        if end == -1:
+            end = size
+        name = mm[start + 1:header_end].decode().strip()
+        yield name, normalize(mm[header_end:end])
+        start = end + 1
+
+
+def _fastq_records(mm):
+    start = 0
+    size = len(mm)
+    while start < size:
+        lines = []
+        position = start
+        for _ in range(4):
+            end = mm.find(b"\n", position)
+            if end == -1:
+                end = size
+            lines.append((position, end))
+            position = end + 1
+        header, sequence, separator = lines[0], lines[1], lines[2]
+        if mm[header[0]:header[0] + 1] != b"@" or mm[separator[0]:separator[0] + 1] != b"+":
+            raise ValueError("Malformed FASTQ record at byte " + str(start))
+        yield mm[header[0] + 1:header[1]].decode().strip(), normalize(mm[sequence[0]:sequence[1]])
+        start = position
+        # skip blank lines between records
+        while start < size and mm[start:start + 1] in (b"\n", b"\r"):
+            start += 1
+
+
+def read_sample(path):
+    """
+        Description: Read a two column sample file (3' base, 5' base per line)
+
+        Returns: (three, five) base code arrays
+    """
+    with open(path, "rb") as f:
+        codes = normalize(f.read())
+    if codes.size % 2:
+        raise ValueError(str(path) + " does not have two bases on every line")
+    return codes[0::2], codes[1::2]
+
+
+def unambiguous_runs(codes, minimum=1):
+    """
+        Description: Split a record at ambiguous bases so each piece can go to the
+        nearest neighbor engine
+
+        Returns: Generator of (offset, codes) for every run of at least minimum
+            unambiguous bases
+    """
+    ambiguous = numpy.flatnonzero(codes == N_CODE)
+    starts = numpy.concatenate(([0], ambiguous + 1))
+    ends = numpy.concatenate((ambiguous, [len(codes)]))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if end - start >= minimum:
+            yield start, codes[start:end]
+
+
+def to_sequence(three, five=None):
+    """
+        Description: Build a Sequence from base codes without decoding to text
+
+        Input: three - 3' base codes, five - 5' base codes (complement when not given)
+    """
+    if (numpy.asarray(three) >= N_CODE).any() or (five is not None and (numpy.asarray(five) >= N_CODE).any()):
+        raise ValueError("Ambiguous bases cannot be put in a Sequence")
+    return Sequence.from_codes(three, five)
@@ -0,0 +1,86 @@
+import atexit
+import json
+import os
+import time
+
+"""
+    Optional hot path instrumentation for the nearest neighbor engine. Call sites check
+    the module level enabled flag once per call and only then take timestamps, so a
+    disabled run pays a single attribute lookup. Switch on with enable(), the
+    'profile on' REPL command or the DNA_PROFILE environment variable (a path the
+    report is written to at exit).
+"""
+
+enabled = False
+timers = {}
+counters = {}
+started = time.perf_counter()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    global started
+    timers.clear()
+    counters.clear()
+    started = time.perf_counter()
+
+
+def add_time(name, seconds):
+    timers[name] = timers.get(name, 0.0) + seconds
+
+
+def count(name, amount=1):
+    counters[name] = counters.get(name, 0) + amount
+
+
+def report():
+    """
+        Description: Collected timers and counters with derived rates
+
+        Returns: Dictionary with seconds per phase, counters and sequences per second
+    """
+    engine_seconds = timers.get("scalar.total", 0.0) + timers.get("batch.total", 0.0)
+    sequences = counters.get("scalar.sequences", 0) + counters.get("batch.sequences", 0)
+    lookups = counters.get("lookups.match", 0) + counters.get("lookups.mismatch", 0)
+    cache_lookups = counters.get("cache.hits", 0) + counters.get("cache.misses", 0)
+    return {
+        "enabled": enabled,
+        "wall_seconds": time.perf_counter() - started,
+        "timers": dict(sorted(timers.items())),
+        "counters": dict(sorted(counters.items())),
+        "sequences_per_second": sequences / engine_seconds if engine_seconds else 0.0,
+        "inverse_fallback_rate": counters.get("lookups.inverse", 0) / lookups if lookups else 0.0,
+        "cache_hit_rate": counters.get("cache.hits", 0) / cache_lookups if cache_lookups else 0.0
+    }
+
+
+def export(path):
+    """
+        Description: Write the report as JSON to path
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+
+
+def show():
+    """
+        Description: Prints the report
+    """
+    print(json.dumps(report(), indent=2))
+
+
+if os.environ.get("DNA_PROFILE"):
+    enable()
+    atexit.register(export, os.environ["DNA_PROFILE"])
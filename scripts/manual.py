@@ -1,3 +1,6 @@
+from scripts.cache import cached_melting_temperature
+from scripts.duplex import Sequence
+
 """
     Manually enter DNA sequences
 """
@@ -12,7 +15,7 @@ def manual():
     sequence = input(">> ")
     while sequence != "" and sequence != "quit" and sequence != "q":
         if sanitize_sequence(sequence):
-            seq = find_melting_temperature(Sequence(sequence.split('/')[0], sequence.split('/')[1], .0004))
+            seq = cached_melting_temperature(Sequence(sequence.split('/')[0], sequence.split('/')[1], .0004))
             print("Energy: " + str(seq.energy))
             print("Enthalpy: " + str(seq.enthalpy))
             print("Entropy: " + str(seq.entropy))
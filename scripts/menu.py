@@ -1,5 +1,3 @@
-from termcolor import colored
-
 """
     File for help menus and graphics
 """
@@ -8,6 +6,9 @@ def title():
     """
         Description: Prints introduction title
     """
+    # only the banner needs termcolor
+    from termcolor import colored
+
     width = 125
     red = 'red'
     green = 'green'
@@ -38,9 +39,15 @@ def help():
     print("test: Run program on sequence and compare to expected results")
     print("show: Show sequence and expected result for that sequence")
     print("details: Explains experimental conditions and procedure")
-    print("multiple: Enter menu for running and recording multiple sequences")
-    print("difference: Enters menu for dining average difference of mismatch substitution")
+    print("multiple [workers] [seed]: Enter menu for running and recording multiple sequences")
+    print("difference [workers] [seed] [sequences] [substitutions]: Enters menu for dining average difference of mismatch substitution")
     print("manual: Enters mode where user can manually enter sequence")
+    print("scan: Shows the temperature change of every single mismatch of a sequence")
+    print("design: Finds the oligos of a target with a melting temperature in a range")
+    print("sweep <spec.json> [workers]: Checkpointed grid of mismatch differences, run again to resume")
+    print("cache [persist [path]]: Shows hit/miss statistics of the melting temperature cache,")
+    print("    persist keeps results on disk (output/tm_cache.sqlite) across runs")
+    print("profile [on|off|reset|report path]: Engine timers and counters, report writes JSON")
     print()
 
 def details():
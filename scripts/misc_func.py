@@ -1,10 +1,35 @@
-from scripts.genome import find_melting_temperature
-from scripts.duplex import Sequence
+from collections import deque
+from collections import OrderedDict
+import os
+import time
+
+from scripts.cache import cached_melting_temperatures
+from scripts.cache import canonical_key
+from scripts.cache import lookup_results
+from scripts.cache import store_results
+from scripts.cache import tm_cache
+from scripts.genome import find_melting_temperatures
 
 """
     Miscellaneous functions
 """
 
+# duplexes handed to the batch engine at once by run_sequences
+CHUNK_SIZE = 10000
+# chunks waiting on or running in worker processes, bounds memory of parallel runs
+IN_FLIGHT = 2 * (os.cpu_count() or 1)
+# distinct duplexes remembered by unique_chunks to drop repeats
+SEEN_WINDOW = 100000
+
+def chunk_size_for(total, workers=1, chunk_size=CHUNK_SIZE):
+    """
+        Description: Chunk size that gives every worker about four chunks of total
+            sequences, at most chunk_size (chunk_size itself for a single process)
+    """
+    if workers <= 1:
+        return chunk_size
+    return max(1, min(chunk_size, total // (4 * workers)))
+
 def fformat(number):
     """
         Description: Formats negative and position numbers to fit uniformly
@@ -14,26 +39,119 @@ def fformat(number):
     else:
         return str(number) + '\t'
 
-def run_sequences(sequences, name, same_file):
+def run_sequences(sequences, name, sink, chunk_size=CHUNK_SIZE, executor=None, progress=False):
     """
         Description: Find energy, enthalphy, entropy and temperature of each sequence in list
 
-        Input: sequences - list of sequence, name - seudo-sequence, smae_file - sentinel to specify
-            if output should be in the same file
+        Returns: Number of duplexes evaluated
+
+        Input: sequences - iterable of "3'/5'" sequences (may be a generator), name -
+            seudo-sequence, sink - ResultSink the results are written to (see
+            scripts/sink.py), chunk_size - sequences evaluated together, executor -
+            process pool the chunks are spread over (results are still written in
+            order), progress - print throughput while running. Duplexes found in the
+            melting temperature cache (and its persistent store, see scripts/cache.py)
+            are not evaluated again and new results are added to it
     """
-    # create output file with filename + "output.txt"
-    if same_file == True:
-        output = open("output/output.txt", 'a')
+    start = time.perf_counter()
+    count = 0
+    if executor is None:
+        results = ((three_primes, five_primes, cached_melting_temperatures(three_primes, five_primes, keys))
+                   for three_primes, five_primes, keys in unique_chunks(sequences, chunk_size))
     else:
-        output = open("output/" + name + "_output.txt", 'w')
-    for x, sequence in enumerate(sequences):
-        if not (x != 0 and sequences[x] == sequences[x-1]):
-            prime_3 = sequence.split('/')[0]
-            prime_5 = sequence.split('/')[1]
-            s = find_melting_temperature(Sequence(prime_3, prime_5, .004))
-            output.write('\n'+name+ '\n\n')
-            output.write(str(sequence) + '\t' + fformat(s.energy) + fformat(s.enthalpy) + fformat(s.entropy) + fformat(s.temperature) + str(len(prime_3)))
-            output.write('\n')
+        results = ordered_results(unique_chunks(sequences, chunk_size), executor)
+    for three_primes, five_primes, chunk in results:
+        write_results(name, three_primes, five_primes, chunk, sink)
+        count += len(three_primes)
+        if progress:
+            print("\r" + throughput(count, time.perf_counter() - start), end="", flush=True)
+    sink.flush()
+    tm_cache.flush()
+    if progress:
+        print("\r" + throughput(count, time.perf_counter() - start))
+    return count
+
+
+def ordered_results(chunks, executor, ahead=IN_FLIGHT):
+    """
+        Description: Evaluate chunks on a process pool, a bounded number at a time.
+            Chunks are looked up in the cache here and only the misses are sent to the
+            workers, their results are added to the cache when they come back
+
+        Returns: Generator of (three_primes, five_primes, results) in the order of chunks
+
+        Input: chunks - iterable of (three_primes, five_primes, keys), executor - process
+            pool, ahead - chunks in flight at most
+    """
+    pending = deque()
+    for three_primes, five_primes, keys in chunks:
+        results, missing = lookup_results(keys)
+        pending.append((three_primes, five_primes, keys, results, missing, executor.submit(
+            find_melting_temperatures, [three_primes[x] for x in missing], [five_primes[x] for x in missing])))
+        if len(pending) >= ahead:
+            yield finished_chunk(pending.popleft())
+    while pending:
+        yield finished_chunk(pending.popleft())
+
+
+def finished_chunk(item):
+    three_primes, five_primes, keys, results, missing, future = item
+    return three_primes, five_primes, store_results(keys, results, missing, future.result())
+
+
+def throughput(count, seconds):
+    """
+        Description: Progress line for run_sequences
+    """
+    rate = count / seconds if seconds > 0 else 0.0
+    return str(count) + " duplexes in " + str(round(seconds, 2)) + " s (" + str(int(rate)) + " per second)"
+
+
+def unique_chunks(sequences, chunk_size=CHUNK_SIZE, window=SEEN_WINDOW):
+    """
+        Description: Split sequences into chunks for the batch engine, dropping every
+            duplex already seen (either strand reading, see canonical_key) among the
+            last window distinct duplexes. Memory is bounded by the window, not by the
+            length of the expansion: a duplex that comes back after more than window
+            others is written again, its result then comes from the melting temperature
+            cache instead of being evaluated again
+
+        Returns: Generator of (three_primes, five_primes, keys) lists
+
+        Input: sequences - iterable of "3'/5'" sequences, chunk_size - duplexes per chunk,
+            window - keys remembered for deduplication (at least one chunk)
+    """
+    seen = OrderedDict()
+    window = max(window, chunk_size)
+    three_primes = []
+    five_primes = []
+    keys = []
+    for sequence in sequences:
+        prime_3, prime_5 = sequence.split('/')
+        key = canonical_key(prime_3, prime_5)
+        if key in seen:
+            seen.move_to_end(key)
+            continue
+        seen[key] = None
+        if len(seen) > window:
+            seen.popitem(last=False)
+        three_primes.append(prime_3)
+        five_primes.append(prime_5)
+        keys.append(key)
+        if len(three_primes) >= chunk_size:
+            yield three_primes, five_primes, keys
+            three_primes, five_primes, keys = [], [], []
+    if three_primes:
+        yield three_primes, five_primes, keys
+
+
+def write_results(name, three_primes, five_primes, results, sink):
+    """
+        Description: Write a chunk of find_melting_temperatures results to sink
+    """
+    for row in zip(three_primes, five_primes, results["energy"].tolist(), results["enthalpy"].tolist(),
+                   results["entropy"].tolist(), results["temperature"].tolist(), results["length"].tolist()):
+        sink.write(name, *row)
 
 def add_tuples(t1, t2, size):
     """
@@ -1,16 +1,27 @@
-from scripts.sequence_add import add_stretch
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from scripts.sequence_add import add_stretch_rand_double
+from scripts.misc_func import chunk_size_for
 from scripts.misc_func import run_sequences
-from scripts.sequence_add import add_mismatches
+from scripts.sequence_add import expand_mismatches
+from scripts.sequence_add import variant_count
+from scripts.sink import open_sink
 
 """
     Enter multiple different sequences
 """
 
-def multiple():
+def multiple(workers=1, seed=None):
     """
         Description: Interface to run multiple sequence
 
         Output(file): Sequence credentials
+
+        Input: workers - number of processes the variants are evaluated on, seed - seed
+            for reproducible random stretches (one stream for the whole session)
     """
     print()
     print("Enter numbers to indicate what sequences you would like to test")
@@ -22,24 +33,42 @@ def multiple():
     print("Example 2: 4M2 -- four matches , a mismatch and two more matches")
     print("Example 3: 3 -- three matches")
     print("Example 4: R3MR3 -- three random matches , a mismatch and three more random matches")
+    print("Example 5: 3M3M3 -- every combination of mismatches at two positions")
     print()
     print("Enter 'quit', 'exit', or 'q' to exit")
     print("Would you like to store all results in the same file (or separate files)?")
-    same_file = False
     choice = input("(y or n): ")
+    same_file = choice == "y" or choice == "yes"
+    extension = input("Output format (txt, tsv, csv or npy, default txt): ").strip().lower() or "txt"
+    if extension not in ("txt", "tsv", "csv", "npy"):
+        print("Unknown format, using txt")
+        extension = "txt"
     print()
-    if choice == "y" or choice == "yes":
-        open("output/output.txt",'w+')
-        same_file = True
 
-    i = 1
-    sequence = input(str(i) + ": ")
-    while sequence != "exit" and sequence != "quit" and sequence != "q":
-        if sanitize_m(sequence):
-            s = seudo_sequence_converter(sequence)
-            run_sequences(add_mismatches(s), sequence, same_file)
-        i += 1
+    # one writer for the whole session when results share a file
+    sink = open_sink("output/output." + extension) if same_file else None
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    rng = numpy.random.default_rng(seed)
+    try:
+        i = 1
         sequence = input(str(i) + ": ")
+        while sequence != "exit" and sequence != "quit" and sequence != "q":
+            if sanitize_m(sequence):
+                s = seudo_sequence_converter(sequence, rng=rng)
+                # small panels are split too, so every worker gets a share (two templates)
+                chunk_size = chunk_size_for(2 * variant_count([sequence]), workers)
+                if same_file:
+                    run_sequences(expand_mismatches(s), sequence, sink, chunk_size, executor, progress=True)
+                else:
+                    with open_sink("output/" + sequence + "_output." + extension) as separate:
+                        run_sequences(expand_mismatches(s), sequence, separate, chunk_size, executor, progress=True)
+            i += 1
+            sequence = input(str(i) + ": ")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if sink is not None:
+            sink.close()
 
 def sanitize_m(input_m):
     """
@@ -58,61 +87,44 @@ def sanitize_m(input_m):
             if x == 0 or x == len(input_m)-1:
                 print("Mismatch cannot be on the end")
                 return False
+            elif input_m[x+1] == "M":
+                # two mismatches in a row have no nearest neighbor parameters
+                print("Mismatches cannot be next to each other")
+                return False
         elif item == "R":
             if x == len(input_m)-1 or not input_m[x+1].isdigit():
                 print("R cannot be the last character and must be followed by a digit")
                 return False
     return True
 
-def seudo_sequence_converter(sequence):
+def seudo_sequence_converter(sequence, seed=None, rng=None):
     """
-        Descripton: Creates sequences from seudo-sequences and adds them to a list
+        Descripton: Creates sequences from seudo-sequences, one template at a time
 
-        Returns: List of generated sequences
+        Returns: Generator of the G-C matches template and then the A-T matches template,
+            each joined only when it is asked for. Random stretches are drawn once and
+            shared by both templates
 
-        Input: Seudo-sequence, ex: R3MR3 --three random basepairs, mismatch, three random base pairs
+        Input: Seudo-sequence, ex: R3MR3 --three random basepairs, mismatch, three random base pairs,
+            seed, rng - as random_duplexes (scripts/sequence_add.py)
     """
-    # [3'-high, 5'-high, 3'-low, 5'-low]
-    strands = ["","","",""]
-    random = False
-    sequences = []
-    x = 0
-    while x < len(sequence):	
-        if sequence[x] == "R":
-            random = True
-        elif sequence[x].isdigit() and random:
-            temp = sequence[x]
-            i = 1
-            for i in range(1, len(sequence)-x+2):
-                if not sequence[x:x+i].isdigit():
-                    break
-                else:
-                    temp = sequence[x:x+i]
-
-            add_stretch_rand(strands, temp)
-            x+= (i-2)
-            random = False
-        elif sequence[x].isdigit():
-            temp = sequence[x]
-            i = 1
-            for i in range(1, len(sequence)-x+2):
-                if not sequence[x:x+i].isdigit():
-                    break
-                else:
-                    temp = sequence[x:x+i]
-
-            add_stretch(strands, temp)
-            x+= (i-2)
-        elif sequence[x] == "M":
-            strands[0] += "M"
-            strands[1] += "M"
-            strands[2] += "M"
-            strands[3] += "M"
+    rng = numpy.random.default_rng(seed) if rng is None else rng
+    stretches = []
+    for token in re.findall(r"R?[0-9]+|.", sequence):
+        if token == "M":
+            stretches.append(("M", "M"))
+        elif token[0] == "R":
+            stretches.append(tuple(add_stretch_rand_double(token[1:], rng=rng).split('/')))
+        elif token.isdigit():
+            stretches.append(int(token))
         else:
             print("seudo-sequence character not recognized")
-        x+=1
-    sequences.append(strands[0] + '/' + strands[1])
-    sequences.append(strands[2] + '/' + strands[3])
-    return sequences
-
-
+    for pair in ("GC", "AT"):
+        three = []
+        five = []
+        for stretch in stretches:
+            if isinstance(stretch, int):
+                stretch = (stretch * pair[0], stretch * pair[1])
+            three.append(stretch[0])
+            five.append(stretch[1])
+        yield "".join(three) + '/' + "".join(five)
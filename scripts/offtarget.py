@@ -0,0 +1,217 @@
+import json
+import os
+
+import numpy
+
+from scripts.encoding import decode
+from scripts.encoding import encode
+from scripts.energy import dimer_kind
+from scripts.energy import parameter_version
+from scripts.genome import find_melting_temperatures
+from scripts.ingest import N_CODE
+from scripts.ingest import read_records
+
+"""
+    Off-target search. A genome is indexed once: every k-mer without ambiguous
+    bases is packed into an integer and the k-mers are sorted with their positions.
+    The index is saved as .npy files in a directory and memory mapped when loaded,
+    so only the pages a search touches are read.
+
+    A probe is split into max_mismatches + 1 pieces; a site with at most that many
+    mismatches matches at least one piece exactly (pigeonhole), so the k-mer at the
+    start of each piece is a seed. Seed hits are extended to the full probe length
+    on both strands, sites within max_mismatches are kept and every site is scored
+    as a duplex of the probe and the genome with the mismatch nearest neighbor
+    parameters.
+"""
+
+INDEX_FILES = ("genome.npy", "keys.npy", "positions.npy")
+
+# Off-target sites, sorted from the most to the least stable
+site_dtype = numpy.dtype([
+    ("record", numpy.int32),
+    ("position", numpy.int64),
+    ("strand", "S1"),
+    ("mismatches", numpy.int8),
+    ("energy", numpy.float64),
+    ("enthalpy", numpy.float64),
+    ("entropy", numpy.float64),
+    ("temperature", numpy.float64)
+])
+
+
+class KmerIndex(object):
+    """ Sorted k-mer seeds of a genome, loaded from build_index output """
+
+    def __init__(self, directory, mmap_mode="r"):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.k = meta["k"]
+        self.names = meta["names"]
+        self.starts = numpy.array(meta["starts"], dtype=numpy.int64)
+        self.genome, self.keys, self.positions = [
+            numpy.load(os.path.join(directory, name), mmap_mode=mmap_mode) for name in INDEX_FILES]
+
+    def lookup(self, key):
+        """
+            Description: Genome positions of one packed k-mer
+        """
+        left = numpy.searchsorted(self.keys, key, side="left")
+        right = numpy.searchsorted(self.keys, key, side="right")
+        return numpy.asarray(self.positions[left:right], dtype=numpy.int64)
+
+    def locate(self, positions):
+        """
+            Description: Record number and position within the record of genome positions
+        """
+        records = numpy.searchsorted(self.starts, positions, side="right") - 1
+        return records, positions - self.starts[records]
+
+
+def kmer_keys(codes, k):
+    """
+        Description: Pack every k-mer of codes into an integer, 2 bits per base with the
+        first base highest
+
+        Returns: (keys, valid) arrays, valid is False for k-mers with ambiguous bases
+    """
+    count = len(codes) - k + 1
+    if count <= 0:
+        return numpy.zeros(0, dtype=numpy.uint64), numpy.zeros(0, dtype=bool)
+    wide = numpy.asarray(codes).astype(numpy.uint64)
+    keys = numpy.zeros(count, dtype=numpy.uint64)
+    for j in range(k):
+        keys = (keys << numpy.uint64(2)) | (wide[j:j + count] & numpy.uint64(3))
+    ambiguous = numpy.concatenate(([0], numpy.cumsum(numpy.asarray(codes) > 3)))
+    return keys, ambiguous[k:] == ambiguous[:count]
+
+
+def build_index(genome_path, directory, k=12):
+    """
+        Description: Index every k-mer of a FASTA/FASTQ genome and save it
+
+        Returns: KmerIndex of the saved index (memory mapped)
+
+        Input: genome_path - FASTA or FASTQ file, directory - where the .npy files and
+            meta.json are written, k - seed length (1 to 32)
+    """
+    if k < 1 or k > 32:
+        raise ValueError("Seed length has to be between 1 and 32")
+    names = []
+    starts = []
+    pieces = []
+    size = 0
+    for name, codes in read_records(genome_path):
+        names.append(name)
+        starts.append(size)
+        # an ambiguous base between records keeps sites from spanning two of them
+        pieces.append(codes)
+        pieces.append(numpy.array([N_CODE], dtype=numpy.uint8))
+        size += len(codes) + 1
+    if not names:
+        raise ValueError(str(genome_path) + " has no records")
+    genome = numpy.concatenate(pieces)
+
+    keys, valid = kmer_keys(genome, k)
+    positions = numpy.flatnonzero(valid)
+    keys = keys[positions]
+    order = numpy.argsort(keys, kind="stable")
+    position_type = numpy.uint32 if len(genome) < 2 ** 32 else numpy.uint64
+
+    os.makedirs(directory, exist_ok=True)
+    numpy.save(os.path.join(directory, "genome.npy"), genome)
+    numpy.save(os.path.join(directory, "keys.npy"), keys[order].astype(numpy.uint32 if k <= 16 else numpy.uint64))
+    numpy.save(os.path.join(directory, "positions.npy"), positions[order].astype(position_type))
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump({"k": k, "names": names, "starts": starts, "length": len(genome),
+                   "source": os.path.abspath(genome_path), "parameter_version": parameter_version}, f, indent=2)
+    return KmerIndex(directory)
+
+
+def candidate_sites(index, probe, max_mismatches):
+    """
+        Description: Genome positions where the probe could start with at most
+        max_mismatches mismatches, from exact seed hits
+
+        Returns: Sorted array of candidate start positions
+    """
+    pieces = max_mismatches + 1
+    if len(probe) < pieces * index.k:
+        raise ValueError("Probe has to be at least " + str(pieces * index.k) + " bases for "
+                         + str(max_mismatches) + " mismatches with " + str(index.k) + "-mer seeds")
+    piece = len(probe) // pieces
+    keys, _ = kmer_keys(probe, index.k)
+    hits = [index.lookup(keys[offset]) - offset for offset in range(0, pieces * piece, piece)]
+    hits = numpy.unique(numpy.concatenate(hits))
+    return hits[(hits >= 0) & (hits <= len(index.genome) - len(probe))]
+
+
+def find_off_targets(index, probe, max_mismatches=2):
+    """
+        Description: Every site of the indexed genome within max_mismatches of the probe
+        on either strand, scored as a duplex with the probe
+
+        Returns: Structured array (site_dtype) sorted by melting temperature, highest
+            first. Sites whose mismatches are adjacent cannot be scored with the
+            nearest neighbor tables and get NaN values
+
+        Input: index - KmerIndex, probe - probe strand, max_mismatches - allowed
+            mismatches (0 to 2 are supported by the parameters)
+    """
+    if max_mismatches < 0:
+        raise ValueError("Number of mismatches cannot be negative")
+    codes = encode(probe) if isinstance(probe, str) else numpy.asarray(probe, dtype=numpy.uint8)
+    reverse = (codes ^ 3)[::-1].copy()
+    length = len(codes)
+    offsets = numpy.arange(length)
+
+    strands = []
+    threes = []
+    fives = []
+    starts = []
+    counts = []
+    for strand, query in ((b"+", codes), (b"-", reverse)):
+        candidates = candidate_sites(index, query, max_mismatches)
+        if not len(candidates):
+            continue
+        windows = numpy.asarray(index.genome[candidates[:, None] + offsets])
+        mismatches = (windows != query).sum(axis=1)
+        keep = (mismatches <= max_mismatches) & (windows <= 3).all(axis=1)
+        windows = windows[keep]
+        if strand == b"-":
+            # the probe pairs with the top strand: read the site on the bottom strand
+            windows = (windows ^ 3)[:, ::-1]
+        threes.append(numpy.broadcast_to(codes, windows.shape))
+        fives.append(windows ^ 3)
+        starts.append(candidates[keep])
+        counts.append(mismatches[keep])
+        strands.append(numpy.full(int(keep.sum()), strand))
+    if not starts:
+        return numpy.zeros(0, dtype=site_dtype)
+
+    three = numpy.concatenate(threes).astype(numpy.intp)
+    five = numpy.concatenate(fives).astype(numpy.intp)
+    starts = numpy.concatenate(starts)
+    sites = numpy.zeros(len(starts), dtype=site_dtype)
+    sites["record"], sites["position"] = index.locate(starts)
+    sites["strand"] = numpy.concatenate(strands)
+    sites["mismatches"] = numpy.concatenate(counts)
+
+    dimers = (three[:, :-1] << 6) | (three[:, 1:] << 4) | (five[:, :-1] << 2) | five[:, 1:]
+    supported = (dimer_kind[dimers] != 0).all(axis=1)
+    for field in ("energy", "enthalpy", "entropy", "temperature"):
+        sites[field] = numpy.nan
+    if supported.any():
+        results = find_melting_temperatures(three[supported], five[supported])
+        for field in ("energy", "enthalpy", "entropy", "temperature"):
+            sites[field][supported] = results[field]
+    return sites[numpy.argsort(-numpy.nan_to_num(sites["temperature"], nan=-numpy.inf), kind="stable")]
+
+
+def site_sequence(index, site, length):
+    """
+        Description: Genome sequence of an off-target site as read on its strand
+    """
+    start = index.starts[site["record"]] + site["position"]
+    codes = numpy.asarray(index.genome[start:start + length])
+    return decode(codes) if site["strand"] == b"+" else decode((codes ^ 3)[::-1])
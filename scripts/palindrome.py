@@ -0,0 +1,160 @@
+import numpy
+
+from scripts.encoding import encode
+from scripts.ingest import read_records
+from scripts.ingest import unambiguous_runs
+
+"""
+    Self-complementary (symmetric) window index. A duplex window is symmetric, and so
+    gets the SYM entropy term and the 1E-4 oligo molarity when it has no mismatch,
+    when its base pairs read forwards equal its base pairs read backwards from the
+    other strand: 3'[x] 5'[x] == 5'[k-1-x] 3'[k-1-x]. That is a palindrome under the
+    relation "pair equals the other pair seen from the opposite strand", so every
+    shorter window around the same center (between two base pairs for even lengths,
+    on a base pair for odd ones) is symmetric as well. All centers are grown at once
+    with NumPy, one pair per step. That work is the total length of the longest
+    windows: linear for genomic sequence, where three in four centers stop at the
+    first pair, but quadratic in the length of a tandem repeat such as (AT)n. A
+    duplex whose windows outgrow WORK_PER_PAIR comparisons per base pair is handed
+    to a Manacher pass instead, which is linear in any case.
+"""
+
+SEPARATOR = 16
+# vectorized comparisons per base pair before falling back to Manacher
+WORK_PER_PAIR = 64
+
+
+def symmetric_lengths(three, five):
+    """
+        Description: Length of the longest symmetric window around every center
+
+        Returns: Integer array of 2n + 1 lengths. Center c = 2 * position + k is the
+            center of the window of k base pairs starting at position
+
+        Input: three, five - base code arrays of one duplex
+    """
+    three = numpy.asarray(three, dtype=numpy.intp)
+    five = numpy.asarray(five, dtype=numpy.intp)
+    length = len(three)
+    # base pairs, and the same pairs seen from the other strand
+    pairs = (three << 2) | five
+    mirrored = (five << 2) | three
+    lengths = numpy.zeros(2 * length + 1, dtype=numpy.int64)
+
+    # windows of odd length need a middle pair that mirrors itself (equal bases)
+    middles = numpy.flatnonzero(pairs == mirrored)
+    lengths[2 * middles + 1] = 1
+    between = numpy.arange(1, length)
+    centers = numpy.concatenate((2 * between, 2 * middles + 1))
+    left = numpy.concatenate((between - 1, middles - 1))
+    right = numpy.concatenate((between, middles + 1))
+    # grow every window by one pair on both sides while the outer pairs mirror each other
+    budget = WORK_PER_PAIR * (length + 1024)
+    while len(centers):
+        budget -= len(centers)
+        if budget < 0:
+            return manacher_lengths(pairs, mirrored)
+        inside = (left >= 0) & (right < length)
+        inside[inside] = pairs[left[inside]] == mirrored[right[inside]]
+        centers, left, right = centers[inside], left[inside] - 1, right[inside] + 1
+        lengths[centers] += 2
+    return lengths
+
+
+def manacher_lengths(pairs, mirrored):
+    """
+        Description: symmetric_lengths in one linear Manacher pass, for duplexes with
+        long tandem repeats
+
+        Input: pairs, mirrored - pair codes of the duplex read from either strand
+    """
+    size = 2 * len(pairs) + 1
+    # base pairs with separators between them
+    separated = numpy.full(size, SEPARATOR, dtype=numpy.intp)
+    separated_mirror = numpy.full(size, SEPARATOR, dtype=numpy.intp)
+    separated[1::2] = pairs
+    separated_mirror[1::2] = mirrored
+    pairs = separated.tolist()
+    mirrored = separated_mirror.tolist()
+
+    radii = [0] * size
+    left, right = 0, -1
+    for i in range(size):
+        radius = 0
+        if i <= right:
+            radius = min(radii[left + right - i], right - i + 1)
+        while i - radius >= 0 and i + radius < size and pairs[i - radius] == mirrored[i + radius]:
+            radius += 1
+        radii[i] = radius
+        if radius and i + radius - 1 > right:
+            left, right = i - radius + 1, i + radius - 1
+    # a maximal window always ends on a separator, radius - 1 base pairs are inside it
+    return numpy.maximum(numpy.array(radii, dtype=numpy.int64) - 1, 0)
+
+
+class SymmetryIndex(object):
+    """ Symmetric windows of one duplex, built once and queried per window """
+
+    def __init__(self, three_prime, five_prime=None):
+        three = encode(three_prime) if isinstance(three_prime, str) else numpy.asarray(three_prime, dtype=numpy.uint8)
+        if five_prime is None:
+            five = three ^ 3
+        else:
+            five = encode(five_prime) if isinstance(five_prime, str) else numpy.asarray(five_prime, dtype=numpy.uint8)
+        if len(three) != len(five):
+            raise ValueError("Strands have different lengths")
+        self.length = len(three)
+        self.lengths = symmetric_lengths(three, five)
+
+    def is_symmetric(self, position, k):
+        """
+            Description: True when the window of k base pairs at position is symmetric. A
+            single base pair has no neighbors to compare and counts as symmetric, like
+            find_melting_temperature
+        """
+        if position < 0 or k < 1 or position + k > self.length:
+            raise ValueError("Window outside the duplex")
+        return k == 1 or bool(self.lengths[2 * position + k] >= k)
+
+    def symmetric(self, k):
+        """
+            Description: Symmetry flag of every window of k base pairs
+
+            Returns: Boolean array, one flag per window start 0 .. n - k
+        """
+        if k < 1 or k > self.length:
+            raise ValueError("Window length has to be between 1 and the strand length")
+        if k == 1:
+            return numpy.ones(self.length, dtype=bool)
+        return self.lengths[2 * numpy.arange(self.length - k + 1) + k] >= k
+
+    def windows(self, k):
+        """
+            Description: Start positions of the symmetric windows of k base pairs
+        """
+        return numpy.flatnonzero(self.symmetric(k))
+
+    def maximal_windows(self, minimum=2):
+        """
+            Description: Longest symmetric window around every center. Trimming one base
+            pair from both ends of a symmetric window keeps it symmetric, so these
+            describe every symmetric window
+
+            Returns: Generator of (position, length) tuples with length >= minimum
+        """
+        centers = numpy.flatnonzero(self.lengths >= max(minimum, 1))
+        for center, length in zip(centers.tolist(), self.lengths[centers].tolist()):
+            yield (center - length) // 2, length
+
+
+def symmetric_sites(path, k):
+    """
+        Description: Self-complementary windows of k bases in every record of a FASTA or
+        FASTQ file, read as perfectly matched duplexes. Ambiguous bases split the records
+
+        Returns: Generator of (record name, position) tuples
+    """
+    for name, codes in read_records(path):
+        for offset, run in unambiguous_runs(codes, k):
+            for position in SymmetryIndex(run).windows(k).tolist():
+                yield name, offset + position
@@ -0,0 +1,34 @@
+from scripts.energy import bases
+from scripts.genome import scan_mismatches
+from scripts.manual import sanitize_sequence
+
+"""
+    Saturation mutagenesis: every single mismatch of a DNA sequence
+"""
+
+def scan():
+    """
+        Description: Enter a matched DNA sequence (with / separating single strands, or only
+            the 3' strand) and show the change in melting temperature for every single
+            mismatch substitution
+            Ex: >> CATCTGCACG
+        Returns: Table of temperature differences by position and substituted 3' base
+    """
+    print("Enter a matched DNA sequence (3' strand, or both strands separated by '/'),")
+    print("enter nothing, 'quit' or q to finish")
+    sequence = input(">> ")
+    while sequence != "" and sequence != "quit" and sequence != "q":
+        if '/' not in sequence:
+            sequence = sequence + '/' + sequence.translate(str.maketrans("ACGT", "TGCA"))
+        three, five = (sequence.split('/') + [''])[:2]
+        if not sanitize_sequence(sequence):
+            print("Invalid Input")
+        elif five != three.translate(str.maketrans("ACGT", "TGCA")):
+            print("Sequence has to be perfectly matched")
+        else:
+            differences = scan_mismatches(three, five)
+            print("Position\tPair\t" + "\t".join(bases))
+            for x in range(1, len(three) - 1):
+                print(str(x) + "\t\t" + three[x] + five[x] + "\t" + "\t".join(
+                    "-" if value != value else str(round(value, 2)) for value in differences[x]))
+        sequence = input(">> ")
@@ -1,4 +1,8 @@
-import random
+import itertools
+
+import numpy
+
+from scripts.encoding import decode
 
 """
     Functions to add to DNA strands: either add ordered sequence or random
@@ -6,6 +10,8 @@ import random
 
 bases = ['A', 'C', 'G', 'T']
 base_pairs = ["AT", "GC", "TA", "CG"]
+# 3' and 5' bases of every mismatched pair
+mismatch_pairs = ["AC", "AG", "AA", "GA", "GG", "GT", "CA", "CC", "CT", "TC", "TT", "TG"]
 
 def add_stretch(strands,  number):
     """
@@ -23,74 +29,152 @@ def add_stretch(strands,  number):
     strands[3] += number * basepairs[0][1]
     return strands
 
-def add_stretch_rand(strands,  number):
+def add_stretch_rand(strands,  number, seed=None, rng=None):
     """
         Description Add stretch of random matches/mismatches to a strand
 
         Returns: Strands with random base pair matches added
 
-        Input: strands - with strands to appended to, number - number of additions of a base pair 
+        Input: strands - with strands to appended to, number - number of additions of a base pair,
+            seed, rng - as random_duplexes
     """
-    basepairs = ["AT", "GC", "TA", "CG"]
-    for x in range(int(number)):
-        integer = random.randint(0,3)
-        strands[0] += basepairs[integer][0]
-        strands[1] += basepairs[integer][1]
-        strands[2] += basepairs[integer][0]
-        strands[3] += basepairs[integer][1]
+    three, five = add_stretch_rand_double(number, seed, rng).split('/')
+    strands[0] += three
+    strands[1] += five
+    strands[2] += three
+    strands[3] += five
     return strands
 
-def add_stretch_rand_double(number):
+def add_stretch_rand_double(number, seed=None, rng=None):
     """
         Description Add stretch of random matches/mismatches to a strand
 
         Returns: Strands with random base pair matches added to two strands
 
-        number - number of additions of a base pair 
+        number - number of additions of a base pair, seed, rng - as random_duplexes
     """
+    three, five = random_duplexes(1, int(number), seed, rng)
+    return decode(three[0]) + '/' + decode(five[0])
 
-    three = ""
-    five = ""
-    basepairs = ["AT", "GC", "TA", "CG"]
+def add_mismatches(sequence):
+    """
+        Description: Goes through sequences and add possible mismatches as stipulated
 
-    for x in range(int(number)):
-        integer = random.randint(0,3)
-        three += basepairs[integer][0]
-        five += basepairs[integer][1]
+        Returns: List of every variant, see expand_mismatches
+    """
+    return list(expand_mismatches(sequence))
 
-    return three + '/' + five
 
-def add_mismatches(sequence):
+def expand_mismatches(sequences):
     """
-        Description: Goes through sequences and add possible mismatches as stipulated
+        Description: Replace every M of the sequences with each mismatched base pair,
+            one variant for every combination of the M positions. Variants are made
+            one at a time, the full expansion is never held in memory
+
+        Returns: Generator of "3'/5'" strings
 
-        Rule: This will only work if there is one mismatch in the sequence
+        Input: sequences - iterable of "3'/5'" strings with M at the same positions of
+            both strands
     """
-    new_sequence = []
-    for x, item in enumerate(sequence):
-        if "M" in item:
-            matched = item.split("M")
-            for x in range(len(bases)):
-                new_sequence.append(matched[0]+ base_pairs[x][0] + matched[1] + base_pairs[x][1] + matched[2])
-        else:
-            new_sequence.append(item)
-    return new_sequence
+    for sequence in sequences:
+        three, five = sequence.split('/')
+        three_pieces = three.split("M")
+        five_pieces = five.split("M")
+        if len(three_pieces) == 1:
+            yield sequence
+            continue
+        if [len(piece) for piece in three_pieces] != [len(piece) for piece in five_pieces]:
+            raise ValueError("Mismatches have to be at the same positions of both strands: " + sequence)
+        for pairs in itertools.product(mismatch_pairs, repeat=len(three_pieces) - 1):
+            yield (three_pieces[0] + "".join(pair[0] + piece for pair, piece in zip(pairs, three_pieces[1:])) + '/'
+                   + five_pieces[0] + "".join(pair[1] + piece for pair, piece in zip(pairs, five_pieces[1:])))
+
+
+def variant_count(sequences):
+    """
+        Description: Number of variants expand_mismatches makes of sequences
+
+        Input: sequences - "3'/5'" strings or seudo-sequences (one M per mismatch)
+    """
+    return sum(len(mismatch_pairs) ** sequence.split('/')[0].count("M") for sequence in sequences)
+
 
+def draw_mismatch(three, seed=None, rng=None):
+    """
+        Description: Pick a random inner position of the 3' strand and a new base for it
+            that differs from the present one
+
+        Returns: (index, base)
 
-def substitute_mismatch(strand):
+        Input: three - 3' strand, seed, rng - as random_duplexes
+    """
+    rng = numpy.random.default_rng(seed) if rng is None else rng
+    sub_index = int(rng.integers(1, len(three) - 1))
+    # one of the three other bases
+    base = bases[(bases.index(three[sub_index]) + int(rng.integers(1, 4))) % 4]
+    return sub_index, base
+
+
+def substitute_mismatch(strand, seed=None, rng=None):
     """
         Swaps out one member of base pair until it is a mismatch. This is
         used when we want to compare/contrast a sequence with and without
-        a base pair mismatch
+        a base pair mismatch. Only the 3' strand is changed and compared
+    """
+    three, five = strand.split('/')
+    sub_index, base = draw_mismatch(three, seed, rng)
+    return three[:sub_index] + base + three[sub_index+1:] + '/' + five
+
+
+"""
+    Random duplex libraries as base code arrays (A=0, C=1, G=2, T=3), drawn with a
+    NumPy Generator. Pass a seed for reproducible libraries and use duplex_streams
+    to give every worker process its own independent stream.
+"""
+
+def duplex_streams(seed=None, count=1):
+    """
+        Description: Independent random streams spawned from one seed
+
+        Returns: List of count numpy Generators
+    """
+    return [numpy.random.default_rng(stream) for stream in numpy.random.SeedSequence(seed).spawn(count)]
+
+
+def random_duplexes(count, length, seed=None, rng=None):
     """
-    sub_index = random.randint(1, len(strand.split('/')[0]) - 2)
+        Description: Random perfectly matched duplexes
 
-    # keep getting random base until it is different from present one
-    base = bases[random.randint(0,3)]
-    while strand[sub_index] == base:
-        base = bases[random.randint(0,3)]
+        Returns: (three, five) uint8 code matrices of shape (count, length)
+
+        Input: count - number of duplexes, length - base pairs per duplex, seed - seed
+            for a new Generator, rng - Generator to draw from instead
+    """
+    rng = numpy.random.default_rng(seed) if rng is None else rng
+    three = rng.integers(0, 4, size=(count, length), dtype=numpy.uint8)
+    return three, three ^ 3
 
-    return strand.split('/')[0][:sub_index] + base + strand.split('/')[0][sub_index+1:] + '/' + strand.split('/')[1]
 
+def mismatch_variants(three, five, variants=1, seed=None, rng=None):
+    """
+        Description: Single mismatch variants of matched duplexes: a random inner 3'
+            base of every copy is replaced by one of the three other bases
 
+        Returns: (three, five, positions, codes) - code matrices of the count * variants
+            mismatched duplexes (variants of one duplex are consecutive), and the
+            substituted position and new 3' base code of each
 
+        Input: three, five - code matrices from random_duplexes, variants - mismatched
+            copies of every duplex, seed, rng - as random_duplexes
+    """
+    rng = numpy.random.default_rng(seed) if rng is None else rng
+    three = numpy.repeat(numpy.asarray(three, dtype=numpy.uint8), variants, axis=0)
+    five = numpy.repeat(numpy.asarray(five, dtype=numpy.uint8), variants, axis=0)
+    count, length = three.shape
+    if length < 3:
+        raise ValueError("length cannot be less than 3 -- we cannot substitute peripheral matches")
+    rows = numpy.arange(count)
+    positions = rng.integers(1, length - 1, size=count)
+    codes = ((three[rows, positions] + rng.integers(1, 4, size=count)) % 4).astype(numpy.uint8)
+    three[rows, positions] = codes
+    return three, five, positions, codes
@@ -0,0 +1,230 @@
+import asyncio
+import ipaddress
+import json
+import time
+
+from scripts.cli import InputError
+from scripts.cli import parse_duplex
+from scripts.energy import NearestNeighborError
+from scripts.genome import find_melting_temperatures
+
+"""
+    Local melting temperature service (HTTP/JSON, standard library only)
+
+        POST /tm        {"duplexes": ["GCTAGC/CGATCG", "CATCTG"]}
+        GET  /health
+        GET  /metrics
+
+    Requests that arrive within a short window are evaluated together as one batch
+    with the vectorized engine. The queue of waiting requests is bounded; when it is
+    full the server answers 503 so callers back off. Only loopback addresses are
+    accepted so the service never leaves the machine.
+"""
+
+MAX_BODY = 16 * 1024 * 1024
+
+reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class TmServer(object):
+    """ HTTP front end and micro-batching worker around find_melting_temperatures """
+
+    def __init__(self, window=0.005, max_batch=10000, max_queue=1000):
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue(max_queue)
+        self.started = time.time()
+        self.metrics = {"requests": 0, "duplexes": 0, "batches": 0, "rejected": 0, "errors": 0,
+                        "batch_seconds": 0.0}
+
+    async def batcher(self):
+        """
+            Description: Collect queued requests for one window and evaluate them together
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            start = time.perf_counter()
+            three_primes = [three for item in pending for three in item[0]]
+            five_primes = [five for item in pending for five in item[1]]
+            failure = None
+            try:
+                results = await loop.run_in_executor(None, find_melting_temperatures, three_primes, five_primes)
+            except NearestNeighborError:
+                # one request has an unsupported context, evaluate them one by one
+                results = None
+            except Exception as error:
+                # fail the requests of this batch, the batcher keeps serving later ones
+                results = None
+                failure = error
+            self.metrics["batches"] += 1
+            self.metrics["duplexes"] += size
+            self.metrics["batch_seconds"] += time.perf_counter() - start
+
+            offset = 0
+            for three, five, future in pending:
+                if results is not None:
+                    result = results[offset:offset + len(three)]
+                elif failure is not None:
+                    result = failure
+                else:
+                    try:
+                        result = await loop.run_in_executor(None, find_melting_temperatures, three, five)
+                    except Exception as error:
+                        result = error
+                offset += len(three)
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def evaluate(self, three_primes, five_primes):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((three_primes, five_primes, future))
+        return await future
+
+    async def handle(self, method, path, body):
+        """
+            Description: Route one request
+
+            Returns: (status, JSON serializable response)
+        """
+        if path == "/health":
+            return 200, {"status": "ok", "queue": self.queue.qsize()}
+        if path == "/metrics":
+            metrics = dict(self.metrics)
+            metrics["queue"] = self.queue.qsize()
+            metrics["queue_limit"] = self.queue.maxsize
+            metrics["uptime_s"] = time.time() - self.started
+            metrics["mean_batch_size"] = metrics["duplexes"] / metrics["batches"] if metrics["batches"] else 0.0
+            return 200, metrics
+        if path != "/tm":
+            return 404, {"error": "unknown path " + path}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            request = json.loads(body or b"{}")
+            if "duplexes" in request:
+                lines = request["duplexes"]
+                if not isinstance(lines, list):
+                    raise TypeError("duplexes has to be a list")
+            elif request.get("five_prime") is None:
+                # the 5' strand defaults to the complement
+                lines = [request["three_prime"]]
+            else:
+                lines = [request["three_prime"] + "/" + request["five_prime"]]
+            pairs = [parse_duplex(line) for line in lines]
+        except (ValueError, KeyError, TypeError, AttributeError, InputError):
+            return 400, {"error": "expected {\"duplexes\": [\"3'/5'\", ...]}"}
+
+        try:
+            results = await self.evaluate([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+        except asyncio.QueueFull:
+            self.metrics["rejected"] += 1
+            return 503, {"error": "queue full, retry later"}
+        except NearestNeighborError as error:
+            return 422, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": "evaluation failed: " + str(error)}
+        return 200, {"results": [
+            {"three_prime": three, "five_prime": five, "energy": energy, "enthalpy": enthalpy,
+             "entropy": entropy, "temperature": temperature, "complementary": complementary}
+            for (three, five), energy, enthalpy, entropy, temperature, complementary in zip(
+                pairs, results["energy"].tolist(), results["enthalpy"].tolist(), results["entropy"].tolist(),
+                results["temperature"].tolist(), results["complementary"].tolist())]}
+
+    async def connection(self, reader, writer):
+        """
+            Description: Serve HTTP/1.1 requests on one connection (keep-alive)
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    status, response = 400, {"error": "bad Content-Length"}
+                    keep_alive = False
+                elif length > MAX_BODY:
+                    status, response = 413, {"error": "body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    self.metrics["requests"] += 1
+                    status, response = await self.handle(method, path.split("?")[0], body)
+                    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                if status >= 400 and status != 503:
+                    self.metrics["errors"] += 1
+
+                payload = json.dumps(response).encode()
+                head = ("HTTP/1.1 " + str(status) + " " + reasons[status] + "\r\n"
+                        + "Content-Type: application/json\r\nContent-Length: " + str(len(payload)) + "\r\n"
+                        + ("Retry-After: 1\r\n" if status == 503 else "")
+                        + ("Connection: keep-alive\r\n" if keep_alive else "Connection: close\r\n") + "\r\n")
+                writer.write(head.encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run(host, port, window, max_batch, max_queue):
+    server = TmServer(window, max_batch, max_queue)
+    batcher = asyncio.ensure_future(server.batcher())
+    listener = await asyncio.start_server(server.connection, host, port)
+    print("Serving melting temperatures on http://" + host + ":" + str(port), flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+def serve(host="127.0.0.1", port=8765, window=0.005, max_batch=10000, max_queue=1000):
+    """
+        Description: Run the service until interrupted
+
+        Input: host - loopback address to bind, port - TCP port, window - seconds to collect
+            requests into one batch, max_batch - duplexes per batch, max_queue - requests
+            allowed to wait before the server answers 503
+    """
+    if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+        raise ValueError("The service only binds to loopback addresses")
+    asyncio.run(run(host, port, window, max_batch, max_queue))
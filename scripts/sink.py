@@ -0,0 +1,195 @@
+import ast
+import csv
+import os
+from abc import ABC
+from abc import abstractmethod
+
+import numpy
+
+from scripts.misc_func import fformat
+
+"""
+    Result sinks. A sink keeps one buffered handle open for as long as results are
+    produced, collects rows and writes them in batches. The format follows the file
+    extension:
+
+        .txt    the original readable report
+        .tsv    tab separated values with a header line
+        .csv    comma separated values with a header line
+        .npy    NumPy structured array, read back with numpy.load(path, mmap_mode='r')
+
+    Every row is (name, three_prime, five_prime, energy, enthalpy, entropy,
+    temperature, length). Call flush() to push buffered rows to disk and close()
+    (or use the sink as a context manager) when done.
+"""
+
+columns = ["name", "three_prime", "five_prime", "energy", "enthalpy", "entropy", "temperature", "length"]
+
+BUFFER_SIZE = 1024 * 1024
+BATCH_ROWS = 10000
+# .npy header size, fixed so the row count can be rewritten in place at close
+NPY_HEADER_SIZE = 256
+
+
+class ResultSink(ABC):
+    """ Base sink: buffers rows and hands them to write_rows in batches """
+
+    def __init__(self, path, append=False, batch=BATCH_ROWS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch = batch
+        self.rows = []
+        self.written = 0
+        self.closed = False
+        self.open(append)
+
+    def open(self, append):
+        exists = append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self.handle = open(self.path, "a" if append else "w", buffering=BUFFER_SIZE, newline="")
+        return exists
+
+    def write(self, name, three, five, energy, enthalpy, entropy, temperature, length):
+        self.rows.append((name, three, five, energy, enthalpy, entropy, temperature, length))
+        if len(self.rows) >= self.batch:
+            self.write_rows(self.rows)
+            self.written += len(self.rows)
+            self.rows = []
+
+    @abstractmethod
+    def write_rows(self, rows):
+        """
+            Description: Write a batch of rows to the open handle
+        """
+
+    def flush(self):
+        if self.rows:
+            self.write_rows(self.rows)
+            self.written += len(self.rows)
+            self.rows = []
+        self.handle.flush()
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.handle.close()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+class TextSink(ResultSink):
+    """ The original output.txt layout """
+
+    def write_rows(self, rows):
+        self.handle.write("".join(
+            "\n" + name + "\n\n" + three + "/" + five + "\t" + fformat(energy) + fformat(enthalpy)
+            + fformat(entropy) + fformat(temperature) + str(length) + "\n"
+            for name, three, five, energy, enthalpy, entropy, temperature, length in rows))
+
+
+class DelimitedSink(ResultSink):
+    """ CSV or TSV with a header line """
+
+    def __init__(self, path, append=False, batch=BATCH_ROWS, delimiter=","):
+        self.delimiter = delimiter
+        ResultSink.__init__(self, path, append, batch)
+
+    def open(self, append):
+        exists = ResultSink.open(self, append)
+        self.writer = csv.writer(self.handle, delimiter=self.delimiter, lineterminator="\n")
+        if not exists:
+            self.writer.writerow(columns)
+        return exists
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+
+class NpySink(ResultSink):
+    """
+        Structured array in .npy format. Strands are fixed width byte fields (width),
+        longer strands are rejected rather than truncated. The header is written with
+        room to spare and rewritten with the final row count at close.
+    """
+
+    def __init__(self, path, append=False, batch=BATCH_ROWS, width=128):
+        self.dtype = numpy.dtype([("name", "S" + str(width)), ("three_prime", "S" + str(width)),
+                                  ("five_prime", "S" + str(width)), ("energy", "<f8"), ("enthalpy", "<f8"),
+                                  ("entropy", "<f8"), ("temperature", "<f8"), ("length", "<i4")])
+        self.width = width
+        ResultSink.__init__(self, path, append, batch)
+
+    def open(self, append):
+        self.count = 0
+        if append and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self.handle = open(self.path, "r+b", buffering=BUFFER_SIZE)
+            self.count = read_npy_count(self.handle, self.dtype)
+            self.handle.seek(0, os.SEEK_END)
+            return True
+        self.handle = open(self.path, "wb", buffering=BUFFER_SIZE)
+        self.handle.write(npy_header(self.dtype, 0))
+        return False
+
+    def write_rows(self, rows):
+        for row in rows:
+            if max(len(row[0]), len(row[1]), len(row[2])) > self.width:
+                raise ValueError("Sequence longer than the .npy field width " + str(self.width) + ": " + row[1])
+        self.handle.write(numpy.array(rows, dtype=self.dtype).tobytes())
+        self.count += len(rows)
+
+    def flush(self):
+        ResultSink.flush(self)
+        # keep the file loadable between flushes, not only after close
+        position = self.handle.tell()
+        self.handle.seek(0)
+        self.handle.write(npy_header(self.dtype, self.count))
+        self.handle.seek(position)
+        self.handle.flush()
+
+
+def npy_header(dtype, count):
+    """
+        Description: Version 1.0 .npy header for count rows of dtype, padded to NPY_HEADER_SIZE
+    """
+    header = repr({"descr": dtype.descr, "fortran_order": False, "shape": (count,)})
+    header += " " * (NPY_HEADER_SIZE - 10 - len(header) - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin-1")
+
+
+def read_npy_count(handle, dtype):
+    """
+        Description: Row count of an existing .npy file written by NpySink
+    """
+    handle.seek(0)
+    start = handle.read(10)
+    if start[:8] != b"\x93NUMPY\x01\x00" or 10 + int.from_bytes(start[8:10], "little") != NPY_HEADER_SIZE:
+        raise ValueError(handle.name + " was not written by a result sink")
+    header = ast.literal_eval(handle.read(NPY_HEADER_SIZE - 10).decode("latin-1"))
+    if numpy.dtype(header["descr"]) != dtype:
+        raise ValueError(handle.name + " has different columns")
+    return header["shape"][0]
+
+
+def open_sink(path, append=False, width=128):
+    """
+        Description: Sink for path, the format follows the extension
+
+        Returns: ResultSink
+
+        Input: path - output file, append - add to an existing file, width - strand
+            field width for .npy
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return NpySink(path, append, width=width)
+    elif extension == ".csv":
+        return DelimitedSink(path, append, delimiter=",")
+    elif extension == ".tsv":
+        return DelimitedSink(path, append, delimiter="\t")
+    return TextSink(path, append)
@@ -0,0 +1,151 @@
+import math
+import statistics
+
+import numpy
+
+"""
+    Streaming statistics for temperature differences. Values can be added one at a
+    time or in arrays and memory does not grow with the number of values: mean and
+    variance are kept with Welford's algorithm (mergeable, so partial results from
+    workers can be combined) and quantiles with the P-square estimator, which is
+    exact while few values have been seen.
+"""
+
+# values kept for exact quantiles before the sketch estimate is used
+EXACT_QUANTILE_LIMIT = 10000
+
+
+class RunningStats(object):
+    """ Count, mean and variance of a stream of values (Welford / Chan et al.) """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def update(self, values):
+        """
+            Description: Add an array of values at once
+        """
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if values.size:
+            other = RunningStats()
+            other.count = int(values.size)
+            other.mean = float(values.mean())
+            other.m2 = float(((values - other.mean) ** 2).sum())
+            self.merge(other)
+
+    def merge(self, other):
+        """
+            Description: Combine with the statistics of another stream
+        """
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        return self
+
+    def variance(self, ddof=0):
+        return self.m2 / (self.count - ddof) if self.count > ddof else float("nan")
+
+    def std(self, ddof=0):
+        return math.sqrt(self.variance(ddof))
+
+
+class QuantileSketch(object):
+    """
+        P-square estimate of one quantile (Jain and Chlamtac, 1985) in constant memory.
+        The first EXACT_QUANTILE_LIMIT values are also kept so small samples get the
+        exact quantile
+    """
+
+    def __init__(self, quantile=0.5, exact_limit=EXACT_QUANTILE_LIMIT):
+        self.quantile = quantile
+        self.exact_limit = exact_limit
+        self.values = []
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value):
+        self.count += 1
+        if self.values is not None:
+            self.values.append(value)
+            if len(self.values) > self.exact_limit:
+                self.values = None
+        if len(self.heights) < 5:
+            self.heights.append(value)
+            self.heights.sort()
+            return
+
+        heights = self.heights
+        positions = self.positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            offset = self.desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (
+                    offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+                    (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i])
+                    / (positions[i + 1] - positions[i])
+                    + (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1])
+                    / (positions[i] - positions[i - 1]))
+                if not heights[i - 1] < height < heights[i + 1]:
+                    # parabolic prediction out of order, fall back to linear
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (
+                        positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def update(self, values):
+        for value in numpy.asarray(values, dtype=numpy.float64).tolist():
+            self.add(value)
+
+    def value(self):
+        """
+            Description: The quantile, exact (interpolated between order statistics, the
+            median of an even count is the mean of the middle two) while all values are
+            kept, the P-square estimate afterwards
+        """
+        if self.count == 0:
+            return float("nan")
+        if self.values is not None:
+            ordered = sorted(self.values)
+            position = self.quantile * (len(ordered) - 1)
+            low = int(math.floor(position))
+            high = min(low + 1, len(ordered) - 1)
+            return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+        return self.heights[2]
+
+
+def critical_value(percentage):
+    """
+        Description: Two sided standard normal critical value, e.g. 1.645 for 90
+    """
+    return statistics.NormalDist().inv_cdf(0.5 + percentage / 200)
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import time
+from multiprocessing import util
+
+from scripts.energy import parameter_version
+
+"""
+    Persistent melting temperature results shared across runs. Results live in a
+    SQLite database (output/tm_cache.sqlite by default) keyed by parameter table
+    version and canonical duplex (see cache.canonical_key). The database runs in
+    WAL mode with a busy timeout so several processes can read and write it at
+    once, and the least recently used rows are removed when it outgrows its size.
+"""
+
+DEFAULT_PATH = "output/tm_cache.sqlite"
+
+
+class TmStore(object):
+    """ SQLite backed result store with batched writes and size based eviction """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=1000000, max_bytes=256 * 1024 * 1024, batch=1000,
+                 check_every=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.batch = batch
+        self.check_every = check_every
+        self.pending = {}
+        self.touched = set()
+        self.connection = None
+        self.pid = None
+        self.rows = 0
+        self.row_bytes = 0
+        self.unchecked = 0
+
+    def connect(self):
+        # connections cannot be shared with forked worker processes
+        if self.connection is None or self.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (version TEXT, length INTEGER, duplex BLOB, energy REAL, "
+                "enthalpy REAL, entropy REAL, temperature REAL, complementary INTEGER, used REAL, "
+                "UNIQUE (version, length, duplex))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            self.connection.commit()
+            self.pid = os.getpid()
+            self.check_size()
+            # pool workers leave without running atexit handlers, but they do run
+            # multiprocessing finalizers
+            util.Finalize(self, self.flush, exitpriority=10)
+            self.pending = {}
+            self.touched = set()
+        return self.connection
+
+    def get(self, key):
+        """
+            Description: Look up a stored result
+
+            Returns: (energy, enthalpy, entropy, temperature, complementary) or None
+
+            Input: key - canonical (length, packed duplex) key
+        """
+        if key in self.pending:
+            return self.pending[key]
+        row = self.connect().execute(
+            "SELECT energy, enthalpy, entropy, temperature, complementary FROM results "
+            "WHERE version = ? AND length = ? AND duplex = ?", (parameter_version, key[0], key[1])).fetchone()
+        if row is None:
+            return None
+        self.touched.add(key)
+        if len(self.touched) >= self.batch:
+            self.flush()
+        return row[:4] + (bool(row[4]),)
+
+    def put(self, key, value):
+        self.connect()
+        self.pending[key] = value
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        """
+            Description: Write pending results and access times in one transaction, then evict
+        """
+        if self.connection is None or self.pid != os.getpid() or not (self.pending or self.touched):
+            return
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(parameter_version, key[0], key[1]) + tuple(value[:4]) + (int(value[4]), now)
+                 for key, value in self.pending.items()])
+            # replaced rows are counted too, the count is corrected when it is checked
+            self.rows += len(self.pending)
+            self.unchecked += len(self.pending)
+            self.connection.executemany(
+                "UPDATE results SET used = ? WHERE version = ? AND length = ? AND duplex = ?",
+                [(now, parameter_version, key[0], key[1]) for key in self.touched])
+        self.pending = {}
+        self.touched = set()
+        self.evict()
+
+    def evict(self):
+        """
+            Description: Remove the least recently used rows when the store is over its
+            entry or size limit. Row count and size are estimated in this process and
+            only counted in the table when the estimate is over a limit or check_every
+            rows have been written (rows written by other processes show up then)
+        """
+        # the size of a row is measured at the first write to an empty table
+        if (self.rows <= self.max_entries and (self.row_bytes or not self.rows)
+                and self.rows * self.row_bytes <= self.max_bytes and self.unchecked < self.check_every):
+            return
+        count, used_bytes = self.check_size()
+        excess = count - self.max_entries
+        if used_bytes > self.max_bytes:
+            # drop to nine tenths of the limit at the measured row size, and at least a
+            # tenth of the rows; the freed pages are reused by later inserts
+            excess = max(excess, count // 10, count - int(self.max_bytes * 0.9 / self.row_bytes))
+        if excess > 0:
+            with self.connection:
+                self.connection.execute(
+                    "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY used LIMIT ?)", (excess,))
+            self.rows = count - excess
+
+    def check_size(self):
+        """
+            Description: Count the rows and used bytes of the table and reset the estimates
+
+            Returns: (rows, used bytes)
+        """
+        count = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        page_size = self.connection.execute("PRAGMA page_size").fetchone()[0]
+        used_pages = (self.connection.execute("PRAGMA page_count").fetchone()[0]
+                      - self.connection.execute("PRAGMA freelist_count").fetchone()[0])
+        self.rows = count
+        self.row_bytes = used_pages * page_size / count if count else 0
+        self.unchecked = 0
+        return count, used_pages * page_size
+
+    def close(self):
+        self.flush()
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
@@ -0,0 +1,278 @@
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+
+import numpy
+
+from scripts.encoding import encode
+from scripts.genome import find_melting_temperatures
+from scripts.sequence_add import mismatch_pairs
+from scripts.sequence_add import random_duplexes
+from scripts.stats import critical_value
+from scripts.stats import QuantileSketch
+from scripts.stats import RunningStats
+
+"""
+    Checkpointed parameter sweeps of the mismatch temperature difference. A sweep
+    is described by a JSON spec:
+
+        {"name": "panel", "lengths": [10, 20], "mismatches": ["AC", "GT"] or "all",
+         "positions": [1, "center"], "concentrations": [0.0004, 0.000001],
+         "sequences": 1000, "seed": 1}
+
+    Every combination of length, mismatch (3' and 5' base), position and oligo
+    concentration is a cell: random matched duplexes are drawn and the change in
+    melting temperature when that mismatch replaces the pair at that position is
+    summarized. Cells run in parallel and each finished cell is written at once
+    (atomically) to output/sweeps/<name>/cells/, so an interrupted sweep resumes
+    where it stopped and finished cells are never computed again.
+"""
+
+SWEEP_ROOT = "output/sweeps"
+DEFAULTS = {"mismatches": "all", "positions": ["center"], "concentrations": [0.0004], "sequences": 100, "seed": 0}
+
+
+def load_spec(path):
+    """
+        Description: Read and check a sweep spec
+
+        Returns: Spec dictionary with defaults filled in
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    return check_spec(spec)
+
+
+def check_spec(spec):
+    """
+        Description: Fill in the defaults of a spec and check every field
+
+        Returns: Spec dictionary, raises ValueError for an invalid spec
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Sweep spec has to be a JSON object")
+    spec = dict(DEFAULTS, **spec)
+    name = spec.get("name")
+    if not isinstance(name, str) or not name or "/" in name or "\\" in name or name.startswith("."):
+        raise ValueError("Sweep needs a name that can be used as a directory")
+    if not is_list(spec.get("lengths"), int) or not spec["lengths"] or min(spec["lengths"]) < 3:
+        raise ValueError("Sweep needs a list of lengths of at least 3 -- we cannot substitute peripheral matches")
+    if spec["mismatches"] == "all":
+        spec["mismatches"] = list(mismatch_pairs)
+    if not is_list(spec["mismatches"], str) or any(pair not in mismatch_pairs for pair in spec["mismatches"]):
+        raise ValueError("Mismatches have to be a list of 3' and 5' bases of mismatched pairs, e.g. AC")
+    if not isinstance(spec["positions"], list) or any(
+            position != "center" and not is_list([position], int) for position in spec["positions"]):
+        raise ValueError("Positions have to be a list of integers or \"center\"")
+    if not is_list(spec["concentrations"], (int, float)) or not spec["concentrations"] or min(
+            spec["concentrations"]) <= 0:
+        raise ValueError("Concentrations have to be a list of positive numbers")
+    if not is_list([spec["sequences"], spec["seed"]], int) or spec["sequences"] < 2 or spec["seed"] < 0:
+        raise ValueError("Sequences have to be an integer of at least 2 and seed a non-negative integer")
+    return spec
+
+
+def is_list(values, kind):
+    # bool is an int in Python but not a valid length, position or count
+    return isinstance(values, list) and all(
+        isinstance(value, kind) and not isinstance(value, bool) for value in values)
+
+
+def cells(spec):
+    """
+        Description: Every cell of the grid, positions outside the inner bases of a
+        length are left out
+
+        Returns: List of (cell id, parameters) tuples
+    """
+    grid = []
+    for length in spec["lengths"]:
+        for pair in spec["mismatches"]:
+            for position in spec["positions"]:
+                index = length // 2 if position == "center" else position
+                if not 0 < index < length - 1:
+                    continue
+                for concentration in spec["concentrations"]:
+                    cell = "L" + str(length) + "_" + pair + "_P" + str(index) + "_C" + repr(float(concentration))
+                    grid.append((cell, {"length": length, "mismatch": pair, "position": index,
+                                        "concentration": concentration}))
+    return grid
+
+
+def run_cell(parameters, sequences, seed, number):
+    """
+        Description: Temperature difference of one cell
+
+        Returns: Dictionary of the parameters with mean, median, 90% half width and count
+
+        Input: parameters - cell parameters, sequences - duplexes drawn, seed - sweep
+            seed, number - cell number, the cell's random stream is spawned from both
+    """
+    rng = numpy.random.default_rng(numpy.random.SeedSequence(seed, spawn_key=(number,)))
+    three, five = random_duplexes(sequences, parameters["length"], rng=rng)
+    matched = find_melting_temperatures(three, five, oligo_molarity=parameters["concentration"])
+    position = parameters["position"]
+    three[:, position], five[:, position] = encode(parameters["mismatch"])
+    mismatched = find_melting_temperatures(three, five, oligo_molarity=parameters["concentration"])
+
+    differences = numpy.abs(mismatched["temperature"] - matched["temperature"])
+    summary = RunningStats()
+    summary.update(differences)
+    median = QuantileSketch(0.5)
+    median.update(differences)
+    result = dict(parameters)
+    result.update({"mean": summary.mean, "median": median.value(), "std": summary.std(),
+                   "confidence_90": critical_value(90) * summary.std() / numpy.sqrt(summary.count),
+                   "samples": summary.count})
+    return result
+
+
+def write_atomic(path, write):
+    """
+        Description: Write a file so that path holds either the old or the complete new
+        contents, never a partial file
+
+        Input: path - file to write, write - function writing the contents to an open
+            text file
+    """
+    directory = os.path.dirname(path)
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(handle, "w") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def write_checkpoint(path, data):
+    write_atomic(path, lambda f: json.dump(data, f, indent=2))
+
+
+def run_sweep(spec, workers=1, root=SWEEP_ROOT, progress=True):
+    """
+        Description: Run every cell of a sweep that has no checkpoint yet
+
+        Returns: (finished cell results in grid order, True when the sweep is complete)
+
+        Input: spec - spec dictionary (see load_spec), workers - processes, root -
+            directory holding the sweeps, progress - print a line per finished cell
+    """
+    spec = check_spec(spec)
+    directory = os.path.join(root, spec["name"])
+    cell_directory = os.path.join(directory, "cells")
+    os.makedirs(cell_directory, exist_ok=True)
+    spec_path = os.path.join(directory, "spec.json")
+    if os.path.exists(spec_path):
+        with open(spec_path) as f:
+            if check_spec(json.load(f)) != spec:
+                raise ValueError("Sweep " + spec["name"] + " already exists with a different spec")
+    else:
+        write_checkpoint(spec_path, spec)
+
+    grid = cells(spec)
+    pending = [(number, cell, parameters) for number, (cell, parameters) in enumerate(grid)
+               if not os.path.exists(os.path.join(cell_directory, cell + ".json"))]
+    if progress:
+        print(str(len(grid) - len(pending)) + " of " + str(len(grid)) + " cells already done")
+
+    start = time.perf_counter()
+    saved = []
+    stop = []
+    # Ctrl-C only asks to stop: cells already running are finished and saved, an
+    # interrupt raised inside the process pool could leave its workers hanging.
+    # Handlers can only be set from the main thread, which is also the only one
+    # Ctrl-C reaches
+    main_thread = threading.current_thread() is threading.main_thread()
+    previous = signal.signal(signal.SIGINT, lambda number, frame: stop.append(number)) if main_thread else None
+    try:
+        if workers > 1:
+            run_parallel(pending, spec, workers, cell_directory, stop, saved, progress)
+        else:
+            for number, cell, parameters in pending:
+                if stop:
+                    break
+                finish_cell(cell_directory, cell, run_cell(parameters, spec["sequences"], spec["seed"], number))
+                report(cell, saved, pending, progress)
+    finally:
+        if previous is not None:
+            signal.signal(signal.SIGINT, previous)
+    complete = len(saved) == len(pending)
+    if not complete and progress:
+        print("\nInterrupted, " + str(len(saved)) + " more cells saved. Run the sweep again to resume")
+
+    results = collect(directory, grid)
+    if complete:
+        write_summary(os.path.join(directory, "results.tsv"), results)
+        if progress:
+            print("Sweep finished in " + str(round(time.perf_counter() - start, 2)) + " s, results in "
+                  + os.path.join(directory, "results.tsv"))
+    return results, complete
+
+
+def run_parallel(pending, spec, workers, cell_directory, stop, saved, progress):
+    """
+        Description: Run cells on a process pool, at most two per worker in flight,
+        until all are saved or stop is set
+    """
+    cells_left = iter(pending)
+    futures = {}
+    with ProcessPoolExecutor(workers, initializer=ignore_interrupt) as executor:
+        while True:
+            while not stop and len(futures) < 2 * workers:
+                number, cell, parameters = next(cells_left, (None, None, None))
+                if cell is None:
+                    break
+                futures[executor.submit(run_cell, parameters, spec["sequences"], spec["seed"], number)] = cell
+            if not futures:
+                return
+            finished, _ = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in finished:
+                cell = futures.pop(future)
+                finish_cell(cell_directory, cell, future.result())
+                report(cell, saved, pending, progress)
+
+
+def ignore_interrupt():
+    # workers leave Ctrl-C to run_sweep, also when they are spawned rather than forked
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def finish_cell(cell_directory, cell, result):
+    write_checkpoint(os.path.join(cell_directory, cell + ".json"), result)
+
+
+def report(cell, saved, pending, progress):
+    saved.append(cell)
+    if progress:
+        print(cell + " (" + str(len(saved)) + "/" + str(len(pending)) + ")")
+
+
+def collect(directory, grid):
+    """
+        Description: Results of the finished cells of a sweep in grid order
+    """
+    results = []
+    for cell, _ in grid:
+        path = os.path.join(directory, "cells", cell + ".json")
+        if os.path.exists(path):
+            with open(path) as f:
+                results.append(json.load(f))
+    return results
+
+
+def write_summary(path, results):
+    columns = ["length", "mismatch", "position", "concentration", "mean", "median", "std", "confidence_90",
+               "samples"]
+    write_atomic(path, lambda f: f.write(
+        "\t".join(columns) + "\n"
+        + "".join("\t".join(str(result[column]) for column in columns) + "\n" for result in results)))
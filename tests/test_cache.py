@@ -0,0 +1,63 @@
+import numpy
+
+from scripts.cache import cached_melting_temperature
+from scripts.cache import cached_melting_temperatures
+from scripts.cache import canonical_key
+from scripts.cache import TmCache
+from scripts.duplex import Sequence
+from scripts.encoding import decode
+from scripts.genome import find_melting_temperature
+from scripts.genome import find_melting_temperatures
+from scripts.sequence_add import mismatch_variants
+from scripts.sequence_add import random_duplexes
+
+"""
+    Duplexes that share a cache key have the same results, and cached results are
+    the computed ones
+"""
+
+
+def scalar(three, five):
+    s = find_melting_temperature(Sequence(three, five, .0004))
+    return s.energy, s.enthalpy, s.entropy, s.temperature, s.complementary
+
+
+def short_pairs(count, length, rng):
+    three, five = random_duplexes(count, length, rng=rng)
+    mismatched = mismatch_variants(three[::2], five[::2], rng=rng)
+    three[::2], five[::2] = mismatched[0], mismatched[1]
+    return [(decode(a), decode(b)) for a, b in zip(three, five)]
+
+
+def test_equal_keys_have_equal_results():
+    rng = numpy.random.default_rng(9)
+    shared = 0
+    for length in (3, 4, 5, 8, 12):
+        for three, five in short_pairs(600, length, rng):
+            flipped_three, flipped_five = five[::-1], three[::-1]
+            if canonical_key(three, five) == canonical_key(flipped_three, flipped_five):
+                shared += 1
+                assert scalar(three, five) == scalar(flipped_three, flipped_five), three + "/" + five
+    assert shared
+
+
+def test_cached_results_are_computed_results():
+    rng = numpy.random.default_rng(11)
+    cache = TmCache(max_entries=50)
+    pairs = short_pairs(1000, 4, rng)
+    for three, five in pairs:
+        s = cached_melting_temperature(Sequence(three, five, .0004), cache)
+        assert (s.energy, s.enthalpy, s.entropy, s.temperature, s.complementary) == scalar(three, five)
+    three_primes = [three for three, _ in pairs]
+    five_primes = [five for _, five in pairs]
+    results = cached_melting_temperatures(three_primes, five_primes, cache=cache)
+    assert (results == find_melting_temperatures(three_primes, five_primes)).all()
+    stats = cache.stats()
+    assert stats["hits"] and stats["evictions"] and stats["entries"] == 50
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = TmCache(max_entries=1000, max_bytes=4000)
+    for three, five in short_pairs(100, 20, numpy.random.default_rng(12)):
+        cache.put(canonical_key(three, five), (0.0, 0.0, 0.0, 0.0, False))
+    assert 0 < cache.stats()["bytes"] <= 4000
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from scripts.genome import find_melting_temperatures
+
+"""
+    Batch commands through main.py, checked by output and exit code
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(args, stdin=""):
+    return subprocess.run([sys.executable, "main.py"] + args, cwd=ROOT, input=stdin, capture_output=True, text=True)
+
+
+def test_tm_results():
+    process = run(["tm"], "ACGTTGCA\n# comment\n\nACGAACT/TGCATGA\nacgt\tTGCA\n")
+    assert process.returncode == 0
+    lines = process.stdout.splitlines()
+    assert lines[0].split("\t")[:2] == ["three_prime", "five_prime"]
+    expected = find_melting_temperatures(["ACGTTGCA", "ACGAACT", "ACGT"], ["TGCAACGT", "TGCATGA", "TGCA"])
+    for line, row in zip(lines[1:], expected):
+        fields = line.split("\t")
+        assert float(fields[5]) == row["temperature"] and int(fields[6]) == row["length"]
+    assert len(lines) == 4
+
+
+def test_tm_invalid_lines():
+    process = run(["tm", "--no-header"], "ACGT\nACGX\nAAAA\n")
+    assert process.returncode == 65 and "line 2" in process.stderr
+    process = run(["tm", "--no-header", "--skip-invalid"], "ACGT\nACGX\nAC/TGC\nAAAA\n")
+    assert process.returncode == 0 and len(process.stdout.splitlines()) == 2
+    assert "line 2" in process.stderr and "line 3" in process.stderr
+
+
+def test_tm_files(tmp_path):
+    source = tmp_path / "in.tsv"
+    source.write_text("ACGTTGCA\n")
+    output = tmp_path / "out.tsv"
+    assert run(["tm", "-i", str(source), "-o", str(output)]).returncode == 0
+    assert len(output.read_text().splitlines()) == 2
+    assert run(["tm", "-i", str(tmp_path / "missing.tsv")]).returncode == 66
+    assert run(["tm", "-i", str(source), "-o", str(tmp_path / "missing" / "out.tsv")]).returncode == 73
+
+
+@pytest.mark.parametrize("args", [["nonsense"], ["tm", "--chunk-size"], ["difference", "--workers", "x"]])
+def test_usage_errors(args):
+    assert run(args).returncode == 2
+
+
+def test_difference_output():
+    process = run(["difference", "--lengths", "5", "20", "--seed", "1", "--sequences", "20"])
+    assert process.returncode == 0
+    lines = process.stdout.splitlines()
+    assert len(lines) == 3 and lines[0].split("\t")[0] == "length"
+    assert [line.split("\t")[0] for line in lines[1:]] == ["5", "20"]
@@ -0,0 +1,69 @@
+import numpy
+import pytest
+
+from scripts import design
+from scripts.design import design_candidates
+from scripts.design import design_probes
+from scripts.encoding import decode
+from scripts.genome import find_melting_temperatures
+
+"""
+    Probe design against evaluating every window of the target with the batch engine
+"""
+
+
+def brute_force(target, kmin, kmax, tm_low, tm_high):
+    """
+        Description: Every window without an ambiguous base in range, evaluated one by one
+
+        Returns: Dictionary of (position, length) -> temperature
+    """
+    found = {}
+    for k in range(kmin, kmax + 1):
+        starts = [p for p in range(len(target) - k + 1) if "N" not in target[p:p + k]]
+        windows = [target[p:p + k] for p in starts]
+        complements = [window.translate(str.maketrans("ACGT", "TGCA")) for window in windows]
+        for p, temperature in zip(starts, find_melting_temperatures(windows, complements)["temperature"].tolist()):
+            if tm_low <= temperature <= tm_high:
+                found[(p, k)] = temperature
+    return found
+
+
+def target(length, seed):
+    rng = numpy.random.default_rng(seed)
+    codes = rng.integers(0, 4, size=length, dtype=numpy.uint8)
+    # self-complementary stretches, and ambiguous bases that split the target
+    for center in rng.integers(10, length - 10, size=length // 50).tolist():
+        codes[center:center + 4] = (codes[center - 4:center] ^ 3)[::-1]
+    text = list(decode(codes))
+    for position in rng.integers(0, length, size=3).tolist():
+        text[position] = "N"
+    return "".join(text)
+
+
+@pytest.mark.parametrize("block", [1 << 16, 37])
+def test_candidates_match_brute_force(monkeypatch, block):
+    monkeypatch.setattr(design, "BLOCK", block)
+    sequence = target(400, 18)
+    for kmin, kmax, tm_low, tm_high in [(2, 6, -1000.0, 1000.0), (8, 14, 300.0, 320.0), (18, 25, 330.0, 340.0)]:
+        found = {(position, k): value
+                 for position, k, value in design_candidates(sequence, kmin, kmax, tm_low, tm_high)}
+        assert found and found == brute_force(sequence, kmin, kmax, tm_low, tm_high)
+
+
+def test_probes_are_the_closest_candidates():
+    sequence = target(300, 19)
+    found = brute_force(sequence, 10, 16, 300.0, 330.0)
+    expected = sorted(found.items(), key=lambda item: (abs(item[1] - 312.0), item[0][1], item[0][0]))[:5]
+    probes = design_probes(sequence, 10, 16, 300.0, 330.0, top=5, tm_target=312.0)
+    assert [(position, length) for _, position, length, _, _ in probes] == [key for key, _ in expected]
+    for distance, position, length, temperature, oligo in probes:
+        assert oligo == sequence[position:position + length]
+        assert temperature == found[(position, length)] and distance == abs(temperature - 312.0)
+
+
+def test_bad_ranges():
+    with pytest.raises(ValueError):
+        list(design_candidates("ACGTACGT", 1, 4, 0, 1000))
+    with pytest.raises(ValueError):
+        list(design_candidates("ACGTACGT", 2, 4, 400, 300))
@@ -0,0 +1,44 @@
+import pytest
+
+from scripts.difference import budget_note
+from scripts.difference import calculate_differences
+from scripts.difference import INCREMENTAL_LENGTH
+
+"""
+    Mismatch difference summaries depend on the seed only, not on how they are run
+"""
+
+
+@pytest.mark.parametrize("length", [5, 20, INCREMENTAL_LENGTH])
+def test_same_results_for_any_worker_count(length):
+    serial = calculate_differences(length, seed=7, sequences=40, substitutions=5)
+    for workers in (2, 3):
+        parallel = calculate_differences(length, workers=workers, seed=7, sequences=40, substitutions=5)
+        # everything but the time taken
+        assert parallel[:4] == serial[:4] and parallel[5] == serial[5]
+    assert serial[3] == 200
+    assert calculate_differences(length, seed=8, sequences=40, substitutions=5)[:2] != serial[:2]
+
+
+def test_converged():
+    # a wide target is met by the first batch, which is the plain run of that many sequences
+    result = calculate_differences(10, seed=3, sequences=20, substitutions=4, target_width=100.0)
+    assert result[5] and budget_note(result) == ""
+    assert result[:4] == calculate_differences(10, seed=3, sequences=20, substitutions=4)[:4]
+
+    result = calculate_differences(10, seed=3, sequences=20, substitutions=4, target_width=0.2,
+                                   max_sequences=100000)
+    half_width = float(result[2].split(" ± ")[1])
+    assert result[5] and half_width <= 0.2
+    # stops at the first batch that reaches the width
+    assert result[3] % 80 == 0 and result[3] > 80
+
+
+def test_budget():
+    result = calculate_differences(10, seed=3, sequences=20, substitutions=4, target_width=1e-6, max_sequences=70)
+    assert not result[5] and budget_note(result) != ""
+    # the last batch is cut to the budget, the streams are those of one run of 70 sequences
+    assert result[3] == 70 * 4
+    assert result[:4] == calculate_differences(10, seed=3, sequences=70, substitutions=4)[:4]
+    with pytest.raises(ValueError):
+        calculate_differences(10, sequences=0)
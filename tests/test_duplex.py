@@ -0,0 +1,64 @@
+import numpy
+import pytest
+
+from scripts.duplex import Sequence
+from scripts.encoding import encode
+from scripts.encoding import pack
+from scripts.encoding import unpack
+
+"""
+    Packed Sequence strands read back as the strings they were set from
+"""
+
+
+def test_strands_round_trip():
+    s = Sequence("ACGAACT", "TGCATGA", .0004)
+    assert (s.three_prime, s.five_prime, s.length) == ("ACGAACT", "TGCATGA", 7)
+    assert s.get_3_s(1, 4) == "CGA" and s.get_5_s(2, 9) == "CATGA"
+    assert s.initial == "AT" and s.terminal == "TA"
+    three, five = s.get_codes()
+    assert three.tolist() == encode("ACGAACT").tolist() and five.tolist() == encode("TGCATGA").tolist()
+
+
+def test_matched_duplex_stores_one_strand():
+    s = Sequence("ACGTTGCA", "TGCAACGT", .0004)
+    assert s.get_packed()[1] is None and s.five_prime == "TGCAACGT"
+    from_codes = Sequence.from_codes(encode("ACGTTGCA"))
+    assert (from_codes.three_prime, from_codes.five_prime) == (s.three_prime, s.five_prime)
+
+
+def test_same_length_three_prime_keeps_five_prime():
+    s = Sequence("ACGAAC", "TGCTTG", .0004)
+    s.three_prime = "ACGTAC"
+    assert (s.three_prime, s.five_prime) == ("ACGTAC", "TGCTTG")
+
+
+def test_other_length_three_prime_resets_to_matched():
+    s = Sequence("ACGAAC", "TGCTTG", .0004)
+    s.three_prime = "ACGTACGT"
+    assert (s.three_prime, s.five_prime, s.length) == ("ACGTACGT", "TGCATGCA", 8)
+    s.set_three_prime("AAA", "TTC")
+    assert (s.three_prime, s.five_prime) == ("AAA", "TTC")
+
+
+def test_five_prime_has_to_match_length():
+    s = Sequence("ACGAAC", "TGCTTG", .0004)
+    with pytest.raises(ValueError):
+        s.five_prime = "TGC"
+    with pytest.raises(ValueError):
+        s.set_three_prime("AAA", "TT")
+
+
+@pytest.mark.parametrize("strand", ["ACGN", "A3", "A٣", "acgt"])
+def test_pack_rejects_other_characters(strand):
+    with pytest.raises(ValueError):
+        pack(strand)
+
+
+def test_unpack_any_range():
+    rng = numpy.random.default_rng(4)
+    for length in range(1, 20):
+        strand = "".join(rng.choice(list("ACGT"), size=length))
+        packed = pack(strand)
+        for start in range(length + 1):
+            assert unpack(packed, length, start) == strand[start:]
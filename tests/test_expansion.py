@@ -0,0 +1,48 @@
+from scripts.cache import canonical_key
+from scripts.misc_func import unique_chunks
+from scripts.multiple import seudo_sequence_converter
+from scripts.sequence_add import expand_mismatches
+from scripts.sequence_add import variant_count
+
+"""
+    Pseudo-sequence templates, their mismatch expansion and the deduplication of the
+    expanded duplexes before they are evaluated
+"""
+
+
+def test_templates():
+    assert list(seudo_sequence_converter("3M2")) == ["GGGMGG/CCCMCC", "AAAMAA/TTTMTT"]
+    high, low = seudo_sequence_converter("R4M12")
+    # random stretches are drawn once and shared by both templates
+    assert high[:4] == low[:4] and high[5:] == "G" * 12 + "/" + high.split('/')[1][:4] + "M" + "C" * 12
+    assert low.endswith("M" + "T" * 12)
+
+
+def test_variant_count():
+    for pseudo in ("5", "3M3", "2M2M2", "R2M1M1M3"):
+        templates = list(seudo_sequence_converter(pseudo))
+        variants = list(expand_mismatches(templates))
+        assert variant_count(templates) == len(variants) == 2 * variant_count([pseudo])
+        assert all("M" not in variant for variant in variants)
+        assert len(set(variants)) == len(variants)
+
+
+def test_unique_chunks_drop_repeats():
+    sequences = list(expand_mismatches(seudo_sequence_converter("2M3M2")))
+    # the same duplexes again, and read from the other strand
+    flipped = [five[::-1] + '/' + three[::-1] for three, five in (s.split('/') for s in sequences)]
+    keys = {canonical_key(*sequence.split('/')) for sequence in sequences + flipped}
+    for chunk_size in (1, 7, 100000):
+        chunks = list(unique_chunks(sequences + sequences + flipped, chunk_size))
+        assert all(len(chunk[0]) <= chunk_size for chunk in chunks)
+        assert sorted(key for chunk in chunks for key in chunk[2]) == sorted(keys)
+
+
+def test_unique_chunks_window():
+    sequences = list(expand_mismatches(["GGMGG/CCMCC"]))
+    assert len(sequences) == 12
+    # repeats within the window are dropped, older ones are written again
+    chunks = list(unique_chunks(sequences + sequences[:3] + sequences, 5, window=12))
+    assert sum(len(chunk[0]) for chunk in chunks) == 12
+    chunks = list(unique_chunks(sequences + sequences, 5, window=6))
+    assert sum(len(chunk[0]) for chunk in chunks) == 24
@@ -0,0 +1,146 @@
+import numpy
+import pytest
+
+from scripts.duplex import Sequence
+from scripts.encoding import decode
+from scripts.genome import evaluate_duplex
+from scripts.genome import find_melting_temperature
+from scripts.genome import find_melting_temperatures
+from scripts.genome import mismatch_difference
+from scripts.genome import parse_genome
+from scripts.genome import scan_melting_temperatures
+from scripts.genome import scan_mismatches
+from scripts.sequence_add import mismatch_variants
+from scripts.sequence_add import random_duplexes
+
+"""
+    The batch engine and the incremental scorers have to give exactly the results
+    of the scalar find_melting_temperature
+"""
+
+fields = ("energy", "enthalpy", "entropy", "temperature", "complementary")
+
+
+def scalar(three, five):
+    s = find_melting_temperature(Sequence(three, five, .0004))
+    return s.energy, s.enthalpy, s.entropy, s.temperature, s.complementary
+
+
+def random_pairs(count, shortest, longest, rng, mismatched=True):
+    """
+        Description: Random duplexes of mixed lengths, every other one with an inner mismatch
+
+        Returns: List of (three_prime, five_prime) strings
+    """
+    pairs = []
+    for number in range(count):
+        three, five = random_duplexes(1, int(rng.integers(shortest, longest + 1)), rng=rng)
+        if mismatched and number % 2 and three.shape[1] > 2:
+            three, five = mismatch_variants(three, five, rng=rng)[:2]
+        pairs.append((decode(three[0]), decode(five[0])))
+    return pairs
+
+
+def self_complementary(count, rng):
+    pairs = []
+    for _ in range(count):
+        half = rng.integers(0, 4, size=int(rng.integers(1, 16)), dtype=numpy.uint8)
+        three = numpy.concatenate([half, (half ^ 3)[::-1]])
+        pairs.append((decode(three), decode(three ^ 3)))
+    return pairs
+
+
+def test_batch_matches_scalar_on_samples():
+    sequences = [parse_genome(number) for number in range(1, 16)]
+    results = find_melting_temperatures([s.three_prime for s in sequences], [s.five_prime for s in sequences])
+    for s, row in zip(sequences, results):
+        assert scalar(s.three_prime, s.five_prime) == tuple(row[field] for field in fields)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_batch_matches_scalar_on_random_duplexes(seed):
+    rng = numpy.random.default_rng(seed)
+    pairs = random_pairs(1000, 2, 40, rng) + self_complementary(100, rng)
+    results = find_melting_temperatures([three for three, _ in pairs], [five for _, five in pairs])
+    assert results["complementary"][-100:].all()
+    for (three, five), row in zip(pairs, results):
+        assert scalar(three, five) == tuple(row[field] for field in fields), three + "/" + five
+
+
+def scan_duplex(length, rng, mismatches=0):
+    """
+        Description: Random duplex with self-complementary stretches and mismatches at
+        least three base pairs apart
+
+        Returns: (three, five) code arrays
+    """
+    three, five = random_duplexes(1, length, rng=rng)
+    three, five = three[0], five[0]
+    for center in rng.integers(4, length - 4, size=length // 20):
+        size = int(rng.integers(2, 5))
+        three[center:center + size] = (three[center - size:center] ^ 3)[::-1]
+    five = three ^ 3
+    for position in range(2, length - 2, max(3, length // (mismatches + 1)))[:mismatches]:
+        three[position] = (three[position] + rng.integers(1, 4)) % 4
+    return three, five
+
+
+@pytest.mark.parametrize("k", [1, 2, 5, 8, 13])
+def test_window_scan_matches_batch(k):
+    rng = numpy.random.default_rng(k)
+    for mismatches in (0, 3):
+        three, five = scan_duplex(200, rng, mismatches)
+        windows = list(scan_melting_temperatures(three, k, five))
+        starts = range(len(three) - k + 1)
+        expected = find_melting_temperatures([decode(three[p:p + k]) for p in starts],
+                                             [decode(five[p:p + k]) for p in starts])
+        assert [window[0] for window in windows] == list(starts)
+        assert [window[1:] for window in windows] == [
+            (row["enthalpy"], row["entropy"], row["temperature"]) for row in expected]
+
+
+def test_window_scan_rejects_bad_windows():
+    with pytest.raises(ValueError):
+        list(scan_melting_temperatures("ACGT", 5))
+    with pytest.raises(ValueError):
+        list(scan_melting_temperatures("ACGT", 2, "TGC"))
+
+
+def test_incremental_mismatch_matches_full_evaluation():
+    rng = numpy.random.default_rng(7)
+    checked = 0
+    for three, five in random_pairs(300, 3, 30, rng, mismatched=False):
+        evaluation = evaluate_duplex(three, five)
+        for index in range(1, len(three) - 1):
+            for base in "ACGT":
+                if base == three[index]:
+                    continue
+                substituted = three[:index] + base + three[index + 1:]
+                assert (scalar(substituted, five)[3] - evaluation["temperature"]
+                        == mismatch_difference(evaluation, index, base)), (three, index, base)
+                checked += 1
+    assert checked
+
+
+def test_saturation_scan_matches_brute_force():
+    rng = numpy.random.default_rng(8)
+    for three, five in random_pairs(200, 2, 30, rng, mismatched=False):
+        differences = scan_mismatches(three, five)
+        original = scalar(three, five)[3]
+        for index in range(len(three)):
+            for code, base in enumerate("ACGT"):
+                if index in (0, len(three) - 1) or base == three[index]:
+                    assert numpy.isnan(differences[index, code])
+                    continue
+                substituted = three[:index] + base + three[index + 1:]
+                assert differences[index, code] == scalar(substituted, five)[3] - original, (three, index, base)
+
+
+def test_substitutions_need_a_matched_duplex():
+    with pytest.raises(ValueError):
+        scan_mismatches("ACGTAC", "TGCCTG")
+    evaluation = evaluate_duplex("ACGTAC", "TGCCTG")
+    with pytest.raises(ValueError):
+        mismatch_difference(evaluation, 2, "A")
+    with pytest.raises(ValueError):
+        mismatch_difference(evaluate_duplex("ACGTAC"), 2, "G")
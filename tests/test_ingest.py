@@ -0,0 +1,71 @@
+import pytest
+
+from scripts.encoding import decode
+from scripts.genome import parse_genome
+from scripts.ingest import normalize
+from scripts.ingest import read_records
+from scripts.ingest import read_sample
+from scripts.ingest import to_sequence
+from scripts.ingest import unambiguous_runs
+
+"""
+    FASTA, FASTQ and sample files read into base codes, whatever their line endings,
+    case and ambiguity codes
+"""
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_bytes(text.encode())
+    return str(path)
+
+
+def as_text(codes):
+    return "".join("ACGTN"[code] for code in codes.tolist())
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_fasta_records(tmp_path, newline):
+    text = newline.join([">first record", "ACGTAC", "gtacgu", ">second", "ACRYN-", "TT", ">empty", ""])
+    records = [(name, as_text(codes)) for name, codes in read_records(write(tmp_path, "a.fa", text))]
+    assert records == [("first record", "ACGTACGTACGT"), ("second", "ACNNNNTT"), ("empty", "")]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_fastq_records(tmp_path, newline):
+    text = newline.join(["@read1", "ACGTn", "+", "IIIII", "", "@read2 extra", "ggcc", "+read2", "IIII"]) + newline
+    records = [(name, as_text(codes)) for name, codes in read_records(write(tmp_path, "a.fq", text))]
+    assert records == [("read1", "ACGTN"), ("read2 extra", "GGCC")]
+
+
+def test_bad_input(tmp_path):
+    assert list(read_records(write(tmp_path, "empty.fa", ""))) == []
+    with pytest.raises(ValueError):
+        list(read_records(write(tmp_path, "a.txt", "ACGT\n")))
+    with pytest.raises(ValueError):
+        list(read_records(write(tmp_path, "b.fa", ">x\nACGZ\n")))
+    with pytest.raises(ValueError):
+        list(read_records(write(tmp_path, "c.fq", "@x\nACGT\nIIII\n")))
+
+
+def test_samples_read_as_written():
+    for number in range(1, 16):
+        with open("dna_samples/dna_sample_" + str(number) + ".txt") as f:
+            pairs = [line.split() for line in f if line.strip()]
+        s = parse_genome(number)
+        assert s.three_prime == "".join(pair[0] for pair in pairs)
+        assert s.five_prime == "".join(pair[1] for pair in pairs)
+
+
+def test_sample_with_odd_base_count(tmp_path):
+    with pytest.raises(ValueError):
+        read_sample(write(tmp_path, "sample.txt", "A T\r\nC\r\n"))
+
+
+def test_unambiguous_runs():
+    codes = normalize(b"ACNNGTTNA")
+    assert [(offset, decode(run)) for offset, run in unambiguous_runs(codes)] == [(0, "AC"), (4, "GTT"), (8, "A")]
+    assert [offset for offset, _ in unambiguous_runs(codes, 3)] == [4]
+    with pytest.raises(ValueError):
+        to_sequence(codes)
+
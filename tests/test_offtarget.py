@@ -0,0 +1,87 @@
+import math
+
+import numpy
+import pytest
+
+from scripts.encoding import decode
+from scripts.genome import find_melting_temperatures
+from scripts.offtarget import build_index
+from scripts.offtarget import find_off_targets
+from scripts.offtarget import KmerIndex
+from scripts.offtarget import site_sequence
+
+"""
+    Seed-and-extend off-target search against a comparison of the probe with
+    every window of the genome on both strands
+"""
+
+complement = str.maketrans("ACGT", "TGCA")
+
+
+def reverse_complement(strand):
+    return strand.translate(complement)[::-1]
+
+
+def mutate(strand, positions, rng):
+    strand = list(strand)
+    for position in positions:
+        strand[position] = "ACGT"[("ACGT".index(strand[position]) + int(rng.integers(1, 4))) % 4]
+    return "".join(strand)
+
+
+@pytest.fixture(scope="module")
+def genome(tmp_path_factory):
+    """
+        Description: Two record genome with the probe planted with 1, 2 (one pair of
+        them adjacent) and 3 mismatches on both strands, and an ambiguous stretch
+
+        Returns: (records, probe, saved KmerIndex)
+    """
+    rng = numpy.random.default_rng(5)
+    records = [decode(rng.integers(0, 4, size=length, dtype=numpy.uint8)) for length in (20000, 5000)]
+    probe = records[0][1000:1024]
+    planted = list(records[1])
+    for position, site in ((100, mutate(probe, [3], rng)), (800, reverse_complement(mutate(probe, [5, 17], rng))),
+                           (2000, mutate(probe, [10, 11], rng)), (3000, mutate(probe, [1, 2, 3], rng))):
+        planted[position:position + len(probe)] = site
+    planted[4000:4002] = "NN"
+    records[1] = "".join(planted)
+    path = tmp_path_factory.mktemp("genome") / "genome.fa"
+    path.write_text("".join(">record " + str(x) + "\n" + record + "\n" for x, record in enumerate(records)))
+    build_index(str(path), str(path.parent / "index"), k=6)
+    return records, probe, KmerIndex(str(path.parent / "index"))
+
+
+def test_sites_match_genome_scan(genome):
+    records, probe, index = genome
+    for max_mismatches in (0, 1, 2):
+        expected = set()
+        for number, record in enumerate(records):
+            for position in range(len(record) - len(probe) + 1):
+                window = record[position:position + len(probe)]
+                if "N" in window:
+                    continue
+                for strand, site in (("+", window), ("-", reverse_complement(window))):
+                    mismatches = sum(a != b for a, b in zip(site, probe))
+                    if mismatches <= max_mismatches:
+                        expected.add((number, position, strand, mismatches))
+        sites = find_off_targets(index, probe, max_mismatches)
+        assert {(int(site["record"]), int(site["position"]), site["strand"].decode(), int(site["mismatches"]))
+                for site in sites} == expected
+    assert len(expected) >= 4
+
+
+def test_sites_are_scored_as_duplexes(genome):
+    records, probe, index = genome
+    sites = find_off_targets(index, probe, 2)
+    for site in sites:
+        sequence = site_sequence(index, site, len(probe))
+        if any(probe[x] != sequence[x] and probe[x + 1] != sequence[x + 1] for x in range(len(probe) - 1)):
+            # adjacent mismatches have no nearest neighbor parameters
+            assert math.isnan(site["temperature"])
+        else:
+            expected = find_melting_temperatures([probe], [sequence.translate(complement)])
+            assert site["temperature"] == expected["temperature"][0]
+    temperatures = numpy.nan_to_num(sites["temperature"], nan=-numpy.inf)
+    assert (temperatures[:-1] >= temperatures[1:]).all()
+    assert site_sequence(index, sites[0], len(probe)) == probe
@@ -0,0 +1,65 @@
+import random
+
+import numpy
+
+from scripts import palindrome
+from scripts.palindrome import SymmetryIndex
+from scripts.palindrome import symmetric_lengths
+
+"""
+    The symmetry index, vectorized or Manacher, against a window by window comparison
+"""
+
+
+def brute_force(three, five, position, k):
+    return all(three[position + x] == five[position + k - 1 - x] and five[position + x] == three[position + k - 1 - x]
+               for x in range(k))
+
+
+def random_duplex(rng, trial):
+    length = rng.randint(1, 40)
+    three = [rng.randrange(4) for _ in range(length)]
+    if trial % 2:
+        # matched duplex with a self-complementary stretch around a random center
+        center = rng.randrange(length)
+        for x in range(min(center, length - center)):
+            three[center + x] = 3 - three[center - 1 - x]
+        return three, [3 - code for code in three]
+    # mismatched duplex that is symmetric as a whole
+    five = [rng.choice([3 - code, rng.randrange(4)]) for code in three]
+    for x in range(length // 2):
+        five[length - 1 - x] = three[x]
+        three[length - 1 - x] = five[x]
+    return three, five
+
+
+def test_symmetric_windows_match_brute_force():
+    rng = random.Random(3)
+    for trial in range(400):
+        three, five = random_duplex(rng, trial)
+        index = SymmetryIndex(numpy.array(three, dtype=numpy.uint8), numpy.array(five, dtype=numpy.uint8))
+        for k in range(1, len(three) + 1):
+            expected = [k == 1 or brute_force(three, five, position, k) for position in range(len(three) - k + 1)]
+            assert index.symmetric(k).tolist() == expected, (three, five, k)
+            assert [index.is_symmetric(position, k) for position in range(len(three) - k + 1)] == expected
+
+
+def test_long_repeats_fall_back_to_manacher(monkeypatch):
+    rng = random.Random(5)
+    duplexes = [random_duplex(rng, trial) for trial in range(200)]
+    # tandem (AT)n repeats have long symmetric windows around every center
+    duplexes += [([0, 3] * n, [3, 0] * n) for n in (1, 5, 40)]
+    expected = [symmetric_lengths(three, five) for three, five in duplexes]
+    monkeypatch.setattr(palindrome, "WORK_PER_PAIR", 0)
+    monkeypatch.setattr(palindrome, "manacher_lengths", calls(palindrome.manacher_lengths))
+    for (three, five), lengths in zip(duplexes, expected):
+        assert (symmetric_lengths(three, five) == lengths).all()
+    assert palindrome.manacher_lengths.count
+
+
+def calls(function):
+    def counted(*args):
+        counted.count += 1
+        return function(*args)
+    counted.count = 0
+    return counted
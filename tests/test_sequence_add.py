@@ -0,0 +1,57 @@
+import numpy
+
+from scripts.encoding import decode
+from scripts.multiple import seudo_sequence_converter
+from scripts.sequence_add import add_stretch_rand
+from scripts.sequence_add import add_stretch_rand_double
+from scripts.sequence_add import duplex_streams
+from scripts.sequence_add import mismatch_variants
+from scripts.sequence_add import random_duplexes
+from scripts.sequence_add import substitute_mismatch
+
+"""
+    Random duplexes and stretches are reproducible from a seed and well formed
+"""
+
+pairs = {"A": "T", "C": "G", "G": "C", "T": "A"}
+
+
+def test_seeded_streams():
+    first = [stream.integers(0, 1 << 30, size=8) for stream in duplex_streams(7, 4)]
+    second = [stream.integers(0, 1 << 30, size=8) for stream in duplex_streams(7, 4)]
+    assert all((a == b).all() for a, b in zip(first, second))
+    # the streams of one seed are independent of each other
+    assert len({tuple(values.tolist()) for values in first}) == 4
+
+
+def test_seeded_duplexes():
+    three, five = random_duplexes(50, 20, seed=3)
+    again = random_duplexes(50, 20, rng=numpy.random.default_rng(3))
+    assert (three == again[0]).all() and (five == again[1]).all()
+    assert ((three ^ five) == 3).all()
+    assert not (three == random_duplexes(50, 20, seed=4)[0]).all()
+
+    variants = mismatch_variants(three, five, 3, seed=5)
+    assert all((a == b).all() for a, b in zip(variants, mismatch_variants(three, five, 3, seed=5)))
+    mismatched = variants[0] != numpy.repeat(three, 3, axis=0)
+    # exactly one inner base of every copy is substituted, the 5' strand is kept
+    assert (mismatched.sum(axis=1) == 1).all()
+    assert not mismatched[:, 0].any() and not mismatched[:, -1].any()
+    assert (mismatched.argmax(axis=1) == variants[2]).all()
+    assert (variants[1] == numpy.repeat(five, 3, axis=0)).all()
+
+
+def test_seeded_stretches():
+    three, five = add_stretch_rand_double(30, seed=9).split('/')
+    assert add_stretch_rand_double(30, seed=9) == three + '/' + five
+    assert len(three) == 30 and five == "".join(pairs[base] for base in three)
+    strands = add_stretch_rand(["G", "C", "A", "T"], 30, seed=9)
+    assert strands == ["G" + three, "C" + five, "A" + three, "T" + five]
+
+    assert list(seudo_sequence_converter("R5MR5", seed=2)) == list(seudo_sequence_converter("R5MR5", seed=2))
+    rng = numpy.random.default_rng(2)
+    sequence = decode(random_duplexes(1, 40, rng=rng)[0][0]) + '/' + decode(random_duplexes(1, 40, rng=rng)[1][0])
+    assert substitute_mismatch(sequence, seed=1) == substitute_mismatch(sequence, seed=1)
+    three, five = substitute_mismatch(sequence, seed=1).split('/')
+    assert five == sequence.split('/')[1]
+    assert sum(a != b for a, b in zip(three, sequence.split('/')[0])) == 1
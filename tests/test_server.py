@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+from scripts.genome import find_melting_temperatures
+from scripts.server import TmServer
+
+"""
+    The service batches concurrent requests, backs off with 503 when its queue is
+    full and answers malformed requests instead of dropping the connection
+"""
+
+
+async def request(port, method, path, body=None, headers=None):
+    """
+        Description: One HTTP request on a new connection
+
+        Returns: (status, JSON response)
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = b"" if body is None else json.dumps(body).encode()
+    headers = dict({"Content-Length": str(len(payload)), "Connection": "close"}, **(headers or {}))
+    writer.write((method + " " + path + " HTTP/1.1\r\n" + "".join(
+        name + ": " + value + "\r\n" for name, value in headers.items()) + "\r\n").encode("latin-1") + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+def serve(test, **options):
+    """
+        Description: Run test(server, port) against a server on a free loopback port
+    """
+    async def run():
+        server = TmServer(**options)
+        batcher = asyncio.ensure_future(server.batcher())
+        listener = await asyncio.start_server(server.connection, "127.0.0.1", 0)
+        try:
+            return await test(server, listener.sockets[0].getsockname()[1])
+        finally:
+            batcher.cancel()
+            listener.close()
+            await listener.wait_closed()
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_are_batched():
+    lines = ["ACGTTGCA", "GCTAGC/CGATCG", "ACGAACT/TGCATGA", "CATCTGCACG"] * 10
+
+    async def test(server, port):
+        responses = await asyncio.gather(*[request(port, "POST", "/tm", {"duplexes": [line]}) for line in lines])
+        expected = find_melting_temperatures([line.split("/")[0] for line in lines], [
+            line.split("/")[1] if "/" in line else line.translate(str.maketrans("ACGT", "TGCA")) for line in lines])
+        for (status, response), row in zip(responses, expected):
+            assert status == 200 and response["results"][0]["temperature"] == row["temperature"]
+        status, metrics = await request(port, "GET", "/metrics")
+        assert metrics["requests"] == len(lines) + 1 and metrics["duplexes"] == len(lines)
+        assert metrics["batches"] < len(lines)
+
+    serve(test, window=0.05)
+
+
+def test_single_duplex_requests():
+    async def test(server, port):
+        status, response = await request(port, "POST", "/tm", {"three_prime": "ACGTAC"})
+        assert status == 200 and response["results"][0]["five_prime"] == "TGCATG"
+        status, response = await request(port, "POST", "/tm", {"three_prime": "ACGTAC", "five_prime": "TGCTTG"})
+        assert status == 200 and response["results"][0]["five_prime"] == "TGCTTG"
+
+    serve(test)
+
+
+def test_bad_requests():
+    async def test(server, port):
+        assert (await request(port, "POST", "/tm", {"duplexes": "ACGT"}))[0] == 400
+        assert (await request(port, "POST", "/tm", {"duplexes": ["ACGX"]}))[0] == 400
+        assert (await request(port, "GET", "/tm"))[0] == 405
+        assert (await request(port, "GET", "/nowhere"))[0] == 404
+        # two neighboring mismatches have no parameters, the other request of the batch is served
+        unsupported, supported = await asyncio.gather(
+            request(port, "POST", "/tm", {"duplexes": ["GCAAGCTT/CGGGCGAA"]}),
+            request(port, "POST", "/tm", {"duplexes": ["GCTAGCTT"]}))
+        assert unsupported[0] == 422 and supported[0] == 200
+        for length in ("ten", "-5"):
+            status, response = await request(port, "POST", "/tm", {"three_prime": "ACGT"},
+                                             {"Content-Length": length})
+            assert (status, response) == (400, {"error": "bad Content-Length"})
+        assert (await request(port, "POST", "/tm", headers={"Content-Length": str(10 ** 9)}))[0] == 413
+        assert server.metrics["errors"] == 8
+        assert (await request(port, "GET", "/health"))[0] == 200
+
+    serve(test)
+
+
+def test_full_queue_answers_503():
+    async def test():
+        # no batcher runs, so the first request stays queued
+        server = TmServer(max_queue=1)
+        waiting = asyncio.ensure_future(server.handle("POST", "/tm", b'{"duplexes": ["ACGT"]}'))
+        await asyncio.sleep(0)
+        status, response = await server.handle("POST", "/tm", b'{"duplexes": ["ACGT"]}')
+        assert status == 503 and server.metrics["rejected"] == 1
+        waiting.cancel()
+
+    asyncio.run(test())
@@ -0,0 +1,70 @@
+import csv
+
+import numpy
+import pytest
+
+from scripts.sink import columns
+from scripts.sink import open_sink
+from scripts.sink import ResultSink
+
+"""
+    Every sink format reads back the rows written to it, also across appends
+"""
+
+rows = [("sample " + str(x), "ACGT" * (x + 1), "TGCA" * (x + 1), -1.5 * x, -20.25 * x, -60.125 * x, 40.5 + x,
+         4 * (x + 1)) for x in range(25)]
+
+
+def write(path, rows, append=False, batch=None):
+    with open_sink(str(path), append) as sink:
+        if batch:
+            sink.batch = batch
+        for row in rows:
+            sink.write(*row)
+
+
+@pytest.mark.parametrize("extension,delimiter", [(".csv", ","), (".tsv", "\t")])
+def test_delimited_round_trip(tmp_path, extension, delimiter):
+    path = tmp_path / ("results" + extension)
+    write(path, rows[:10], batch=3)
+    write(path, rows[10:], append=True)
+    with open(str(path), newline="") as f:
+        read = list(csv.reader(f, delimiter=delimiter))
+    assert read[0] == columns
+    assert read[1:] == [[str(value) for value in row] for row in rows]
+
+
+def test_npy_round_trip(tmp_path):
+    path = tmp_path / "results.npy"
+    write(path, rows[:10], batch=3)
+    write(path, rows[10:], append=True)
+    read = numpy.load(str(path), mmap_mode="r")
+    assert len(read) == len(rows)
+    for stored, row in zip(read, rows):
+        assert tuple(stored[column].decode() for column in columns[:3]) == row[:3]
+        assert tuple(stored[column] for column in columns[3:]) == row[3:]
+
+
+def test_npy_rejects_long_strands(tmp_path):
+    with pytest.raises(ValueError):
+        with open_sink(str(tmp_path / "results.npy"), width=4) as sink:
+            sink.write("long", "ACGTA", "TGCAT", 0.0, 0.0, 0.0, 0.0, 5)
+
+
+def test_text_round_trip(tmp_path):
+    path = tmp_path / "results.txt"
+    write(path, rows[:10], batch=3)
+    write(path, rows[10:], append=True)
+    text = path.read_text()
+    records = ["\n" + row[0] + "\n\n" + row[1] + "/" + row[2] + "\t" for row in rows]
+    positions = [text.find(record) for record in records]
+    assert -1 not in positions and positions == sorted(positions)
+    assert text.count("\nsample ") == len(rows)
+
+
+def test_sinks_have_to_write_rows(tmp_path):
+    class Incomplete(ResultSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(str(tmp_path / "results.out"))
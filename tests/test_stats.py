@@ -0,0 +1,78 @@
+import math
+
+import numpy
+import pytest
+
+from scripts.stats import critical_value
+from scripts.stats import QuantileSketch
+from scripts.stats import RunningStats
+
+"""
+    Streaming mean, variance and median against NumPy on the whole sample
+"""
+
+
+def test_running_stats():
+    rng = numpy.random.default_rng(1)
+    values = rng.normal(40, 3, size=5000)
+    one = RunningStats()
+    for value in values.tolist():
+        one.add(value)
+    batched = RunningStats()
+    for part in numpy.array_split(values, 7):
+        batched.update(part)
+    for summary in (one, batched):
+        assert summary.count == len(values)
+        assert summary.mean == pytest.approx(values.mean(), rel=1e-12)
+        assert summary.variance() == pytest.approx(values.var(), rel=1e-9)
+        assert summary.std(1) == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert math.isnan(RunningStats().variance()) and math.isnan(RunningStats().std(1))
+
+
+def test_merge():
+    rng = numpy.random.default_rng(2)
+    # partial results of uneven size and far apart means, as from workers
+    parts = [rng.normal(mean, 1, size=size) for mean, size in ((0, 10), (1e6, 3000), (-5, 1), (7, 0))]
+    merged = RunningStats()
+    for part in parts:
+        other = RunningStats()
+        other.update(part)
+        assert merged.merge(other) is merged
+    values = numpy.concatenate(parts)
+    assert merged.count == len(values)
+    assert merged.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert merged.variance() == pytest.approx(values.var(), rel=1e-9)
+    empty = RunningStats().merge(RunningStats())
+    assert empty.count == 0 and empty.mean == 0.0
+
+
+@pytest.mark.parametrize("count", [1, 2, 5, 6, 101, 10000])
+def test_exact_median(count):
+    values = numpy.random.default_rng(count).exponential(size=count)
+    median = QuantileSketch(0.5)
+    median.update(values)
+    assert median.value() == pytest.approx(numpy.median(values), rel=1e-12)
+    for quantile in (0.1, 0.9):
+        sketch = QuantileSketch(quantile)
+        sketch.update(values)
+        assert sketch.value() == pytest.approx(numpy.quantile(values, quantile), rel=1e-12)
+    assert math.isnan(QuantileSketch().value())
+
+
+def test_estimated_median():
+    rng = numpy.random.default_rng(3)
+    values = numpy.concatenate((rng.normal(10, 2, size=30000), rng.exponential(5, size=30000)))
+    rng.shuffle(values)
+    median = QuantileSketch(0.5, exact_limit=1000)
+    median.update(values)
+    # past the limit only the five markers are kept
+    assert median.values is None and len(median.heights) == 5
+    assert median.value() == pytest.approx(numpy.median(values), abs=0.1)
+    high = QuantileSketch(0.9, exact_limit=1000)
+    high.update(values)
+    assert high.value() == pytest.approx(numpy.quantile(values, 0.9), abs=0.3)
+
+
+def test_critical_value():
+    assert critical_value(90) == pytest.approx(1.6449, abs=1e-4)
+    assert critical_value(95) == pytest.approx(1.9600, abs=1e-4)
@@ -0,0 +1,97 @@
+import sqlite3
+import time
+
+import numpy
+
+from scripts.cache import canonical_key
+from scripts.cache import cached_melting_temperatures
+from scripts.cache import TmCache
+from scripts.encoding import decode
+from scripts.genome import find_melting_temperatures
+from scripts.sequence_add import random_duplexes
+from scripts.store import TmStore
+
+"""
+    Results written to the SQLite store read back in a new process-level store, and
+    the store stays within its limits by dropping the least recently used rows
+"""
+
+
+def keys(count, length=12, seed=10):
+    three, five = random_duplexes(count, length, seed=seed)
+    return [canonical_key(decode(a), decode(b)) for a, b in zip(three, five)]
+
+
+def rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "tm.sqlite")
+    store = TmStore(path, batch=7)
+    values = {key: (-1.5 * x, -10.25 * x, -30.125 * x, 40.0 + x, bool(x % 2)) for x, key in enumerate(keys(50))}
+    for key, value in values.items():
+        store.put(key, value)
+    store.close()
+
+    store = TmStore(path)
+    assert all(store.get(key) == value for key, value in values.items())
+    assert store.get(keys(1, seed=11)[0]) is None
+    store.close()
+    assert rows(path) == 50
+
+
+def test_cache_backed_by_store(tmp_path):
+    path = str(tmp_path / "tm.sqlite")
+    three, five = random_duplexes(200, 15, seed=3)
+    three = [decode(row) for row in three]
+    five = [decode(row) for row in five]
+    expected = find_melting_temperatures(three, five)
+
+    cache = TmCache(store=TmStore(path))
+    assert (cached_melting_temperatures(three, five, cache=cache) == expected).all()
+    cache.store.close()
+
+    cache = TmCache(store=TmStore(path))
+    assert (cached_melting_temperatures(three, five, cache=cache) == expected).all()
+    assert cache.stats()["store_hits"] == len(set(canonical_key(a, b) for a, b in zip(three, five)))
+    assert cache.stats()["misses"] == 0
+    cache.store.close()
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    path = str(tmp_path / "tm.sqlite")
+    store = TmStore(path, max_entries=100, batch=10)
+    old, recent = keys(200), keys(20, seed=12)
+    for key in old:
+        store.put(key, (0.0, 0.0, 0.0, 0.0, False))
+    store.flush()
+    assert rows(path) <= 100
+    time.sleep(0.01)
+    for key in recent:
+        store.put(key, (1.0, 1.0, 1.0, 1.0, True))
+    for key in old[-100:]:
+        store.put(key, (0.0, 0.0, 0.0, 0.0, False))
+    store.close()
+    assert rows(path) <= 100
+    store = TmStore(path)
+    assert all(store.get(key) is not None for key in old[-50:])
+    store.close()
+
+
+def test_byte_limit(tmp_path):
+    path = str(tmp_path / "tm.sqlite")
+    store = TmStore(path, max_bytes=64 * 1024, batch=500)
+    for key in keys(5000, length=40):
+        store.put(key, (0.0, 0.0, 0.0, 0.0, False))
+    store.close()
+    connection = sqlite3.connect(path)
+    page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+    used = (connection.execute("PRAGMA page_count").fetchone()[0]
+            - connection.execute("PRAGMA freelist_count").fetchone()[0])
+    connection.close()
+    assert 0 < rows(path) < 5000 and used * page_size <= 2 * 64 * 1024
@@ -0,0 +1,79 @@
+import os
+import signal
+
+import pytest
+
+from scripts import sweep
+
+"""
+    Sweeps resume from their checkpoints and refuse a changed spec
+"""
+
+spec = {"name": "panel", "lengths": [6, 9], "mismatches": ["AC", "GT"], "sequences": 20, "seed": 5}
+
+
+def cell_files(root):
+    return sorted(os.listdir(os.path.join(str(root), "panel", "cells")))
+
+
+def test_resume_after_interrupt(tmp_path, monkeypatch):
+    complete_results, complete = sweep.run_sweep(spec, root=str(tmp_path / "complete"), progress=False)
+    assert complete and len(complete_results) == 4
+
+    run_cell = sweep.run_cell
+    calls = []
+
+    def interrupted(*args):
+        # Ctrl-C while the second cell runs: that cell is saved, the rest are not started
+        calls.append(args)
+        if len(calls) == 2:
+            os.kill(os.getpid(), signal.SIGINT)
+        return run_cell(*args)
+
+    monkeypatch.setattr(sweep, "run_cell", interrupted)
+    results, complete = sweep.run_sweep(spec, root=str(tmp_path), progress=False)
+    assert not complete and len(results) == 2 and len(calls) == 2
+    assert not os.path.exists(str(tmp_path / "panel" / "results.tsv"))
+
+    # a temporary file left by a write that never finished is not a finished cell
+    open(str(tmp_path / "panel" / "cells" / ".tmp-partial"), "w").close()
+    calls.clear()
+    results, complete = sweep.run_sweep(spec, root=str(tmp_path), progress=False)
+    assert complete and len(calls) == 2
+    assert results == complete_results
+    assert (tmp_path / "panel" / "results.tsv").read_text() == (
+        tmp_path / "complete" / "panel" / "results.tsv").read_text()
+
+    calls.clear()
+    assert sweep.run_sweep(spec, root=str(tmp_path), progress=False) == (complete_results, True)
+    assert not calls
+
+
+def test_parallel_matches_serial(tmp_path):
+    serial = sweep.run_sweep(spec, root=str(tmp_path / "serial"), progress=False)
+    parallel = sweep.run_sweep(spec, workers=2, root=str(tmp_path / "parallel"), progress=False)
+    assert serial == parallel
+
+
+def test_changed_spec_is_rejected(tmp_path):
+    sweep.run_sweep(spec, root=str(tmp_path), progress=False)
+    with pytest.raises(ValueError):
+        sweep.run_sweep(dict(spec, sequences=30), root=str(tmp_path), progress=False)
+    assert cell_files(tmp_path) == [cell + ".json" for cell, _ in sorted(sweep.cells(sweep.check_spec(spec)))]
+
+
+@pytest.mark.parametrize("bad", [
+    [],
+    {"lengths": [6]},
+    {"name": 3, "lengths": [6]},
+    {"name": "../panel", "lengths": [6]},
+    {"name": "panel", "lengths": 6},
+    {"name": "panel", "lengths": [2]},
+    {"name": "panel", "lengths": [6], "mismatches": ["AT"]},
+    {"name": "panel", "lengths": [6], "positions": "center"},
+    {"name": "panel", "lengths": [6], "concentrations": [0]},
+    {"name": "panel", "lengths": [6], "sequences": "20"},
+])
+def test_invalid_spec(bad):
+    with pytest.raises(ValueError):
+        sweep.check_spec(bad)